@@ -1,4 +1,5 @@
 import json
+import os
 from pathlib import Path
 from PyQt6.QtCore import QSettings
 
@@ -616,6 +617,50 @@ def set_image_flip_y(value: bool):
     QSettings().setValue(_IMAGE_FLIP_Y, value)
 
 
+_IMAGE_PROCESS_ON_LOAD = "image_process_on_load"
+IMAGE_PROCESS_ON_LOAD__DEFAULT = False
+
+
+def get_image_process_on_load() -> bool:
+    return QSettings().value(
+        _IMAGE_PROCESS_ON_LOAD, defaultValue=IMAGE_PROCESS_ON_LOAD__DEFAULT, type=bool
+    )
+
+
+def set_image_process_on_load(value: bool):
+    QSettings().setValue(_IMAGE_PROCESS_ON_LOAD, value)
+
+
+_IMAGE_CODEC = "image_codec"
+IMAGE_CODEC_PNG = "PNG"
+IMAGE_CODEC_WEBP = "WebP (Lossless)"
+IMAGE_CODEC_RAW = "Raw"
+IMAGE_CODECS = [IMAGE_CODEC_PNG, IMAGE_CODEC_WEBP, IMAGE_CODEC_RAW]
+IMAGE_CODEC__DEFAULT = IMAGE_CODEC_PNG
+
+
+def get_image_codec() -> str:
+    return QSettings().value(_IMAGE_CODEC, defaultValue=IMAGE_CODEC__DEFAULT, type=str)
+
+
+def set_image_codec(value: str):
+    QSettings().setValue(_IMAGE_CODEC, value)
+
+
+_IMAGE_PNG_COMPRESSION = "image_png_compression"
+IMAGE_PNG_COMPRESSION__DEFAULT = 3
+
+
+def get_image_png_compression() -> int:
+    return QSettings().value(
+        _IMAGE_PNG_COMPRESSION, defaultValue=IMAGE_PNG_COMPRESSION__DEFAULT, type=int
+    )
+
+
+def set_image_png_compression(value: int):
+    QSettings().setValue(_IMAGE_PNG_COMPRESSION, value)
+
+
 _ROI_ACQUISITION_ORIENTATION = "roi_acquisition_orientation"
 ROI_ACQUISITION_ORIENTATIONS = ["Horizontal", "Vertical"]
 ROI_ACQUISITION_ORIENTATION__DEFAULT = ROI_ACQUISITION_ORIENTATIONS[0]
@@ -881,6 +926,23 @@ def set_watershed(value: bool):
     QSettings().setValue(_WATERSHED, value)
 
 
+_SEGMENTATION_ENGINE = "segmentation_engine"
+SEGMENTATION_ENGINE_SKIMAGE = "scikit-image"
+SEGMENTATION_ENGINE_OPENCV = "OpenCV"
+SEGMENTATION_ENGINES = [SEGMENTATION_ENGINE_SKIMAGE, SEGMENTATION_ENGINE_OPENCV]
+SEGMENTATION_ENGINE__DEFAULT = SEGMENTATION_ENGINE_SKIMAGE
+
+
+def get_segmentation_engine() -> str:
+    return QSettings().value(
+        _SEGMENTATION_ENGINE, defaultValue=SEGMENTATION_ENGINE__DEFAULT, type=str
+    )
+
+
+def set_segmentation_engine(value: str):
+    QSettings().setValue(_SEGMENTATION_ENGINE, value)
+
+
 _MIN_STAIN_AREA_PX = "min_stain_area_px"
 MIN_STAIN_AREA_PX = 4
 
@@ -933,6 +995,67 @@ def set_max_stain_count(value: int):
     QSettings().setValue(_MAX_STAIN_COUNT, value)
 
 
+# Longest side (px) of the downsampled image processed while dragging threshold sliders
+THRESHOLD_PREVIEW_MAX_SIZE = 1000
+
+_CARD_PROCESS_WORKERS = "card_process_workers"
+CARD_PROCESS_WORKERS__DEFAULT = max(1, (os.cpu_count() or 1) - 1)
+
+
+def get_card_process_workers() -> int:
+    return QSettings().value(
+        _CARD_PROCESS_WORKERS, defaultValue=CARD_PROCESS_WORKERS__DEFAULT, type=int
+    )
+
+
+def set_card_process_workers(value: int):
+    QSettings().setValue(_CARD_PROCESS_WORKERS, value)
+
+
+_IMAGE_CACHE_MB = "image_cache_mb"
+IMAGE_CACHE_MB__DEFAULT = 512
+
+
+def get_image_cache_mb() -> int:
+    return QSettings().value(
+        _IMAGE_CACHE_MB, defaultValue=IMAGE_CACHE_MB__DEFAULT, type=int
+    )
+
+
+def set_image_cache_mb(value: int):
+    QSettings().setValue(_IMAGE_CACHE_MB, value)
+
+
+_PROCESSING_MEMORY_MB = "processing_memory_mb"
+PROCESSING_MEMORY_MB__DEFAULT = 1024
+
+
+def get_processing_memory_mb() -> int:
+    return QSettings().value(
+        _PROCESSING_MEMORY_MB, defaultValue=PROCESSING_MEMORY_MB__DEFAULT, type=int
+    )
+
+
+def set_processing_memory_mb(value: int):
+    QSettings().setValue(_PROCESSING_MEMORY_MB, value)
+
+
+# Droplet stat confidence intervals, bootstrapping is off with 0 resamples
+_BOOTSTRAP_RESAMPLES = "bootstrap_resamples"
+BOOTSTRAP_RESAMPLES__DEFAULT = 0
+BOOTSTRAP_CONFIDENCE = 0.95
+
+
+def get_bootstrap_resamples() -> int:
+    return QSettings().value(
+        _BOOTSTRAP_RESAMPLES, defaultValue=BOOTSTRAP_RESAMPLES__DEFAULT, type=int
+    )
+
+
+def set_bootstrap_resamples(value: int):
+    QSettings().setValue(_BOOTSTRAP_RESAMPLES, value)
+
+
 # SprayCard Processed Image Colors
 
 COLOR_STAIN_OUTLINE = (226, 43, 138)  # Red-Pink
@@ -3475,25 +3475,11 @@ class AtomizationModel:
     """
 
     def _dsc(self, dv01=None, dv05=None):
-        r = self.ref_nozzles
-        dsc_01, dsc_05 = "", ""
         if dv01 == None:
             dv01 = self.dv01()
         if dv05 == None:
             dv05 = self.dv05()
-        if dv01 <= 0 or dv05 <= 0:
-            return ""
-        if np.isnan(dv01) or np.isnan(dv05):
-            return ""
-        for category in r.keys():
-            if r[category]["DV01"][0] <= dv01 <= r[category]["DV01"][1]:
-                dsc_01 = category
-            if r[category]["DV05"][0] <= dv05 <= r[category]["DV05"][1]:
-                dsc_05 = category
-        dsc = dsc_05
-        if r[dsc_01]["RANK"] < r[dsc_05]["RANK"]:
-            dsc = dsc_01
-        return dsc
+        return str(self.classify_dsc(dv01, dv05))
 
     def _dsc_color(self, dsc) -> str:
         r = self.ref_nozzles
@@ -3503,13 +3489,43 @@ class AtomizationModel:
         return color
 
     def _dsc_color_dv(self, dv: int, dv_key: str) -> str:
-        r = self.ref_nozzles
-        color = "#FFFFFF"
-        if dv > 0:
-            for category in r.keys():
-                if r[category][dv_key][0] <= dv <= r[category][dv_key][1]:
-                    color = r[category]["Color"]
-        return color
+        return str(self.classify_dv_color(dv, dv_key))
+
+    """
+    Array in/array out classification against the ref_nozzles category boundaries.
+    dv values at or below 0, NaN or past the last category have no category,
+    classified as "" with color white.
+    """
+
+    @staticmethod
+    def classify_dv(dv, dv_key: str) -> np.ndarray:
+        # Index in ref_nozzles of the category each dv falls in, -1 if none. A dv
+        # on a boundary belongs to the upper category
+        dv = np.asarray(dv, dtype=float)
+        lower, upper = _CATEGORY_BOUNDS[dv_key]
+        index = np.searchsorted(lower, dv, side="right") - 1
+        return np.where((dv > 0) & (dv <= upper), index, -1)
+
+    @staticmethod
+    def classify_rank(dv01, dv05) -> np.ndarray:
+        # Rank of the droplet spectrum category, the finer of the dv01 and dv05
+        # categories, -1 if either has none
+        rank01 = _CATEGORY_RANKS[AtomizationModel.classify_dv(dv01, "DV01")]
+        rank05 = _CATEGORY_RANKS[AtomizationModel.classify_dv(dv05, "DV05")]
+        return np.where((rank01 < 0) | (rank05 < 0), -1, np.minimum(rank01, rank05))
+
+    @staticmethod
+    def classify_dsc(dv01, dv05) -> np.ndarray:
+        return _CATEGORY_NAMES[AtomizationModel.classify_rank(dv01, dv05)]
+
+    @staticmethod
+    def classify_dsc_color(dv01, dv05) -> np.ndarray:
+        return _CATEGORY_COLORS[AtomizationModel.classify_rank(dv01, dv05)]
+
+    @staticmethod
+    def classify_dv_color(dv, dv_key: str) -> np.ndarray:
+        index = AtomizationModel.classify_dv(dv, dv_key)
+        return _CATEGORY_COLORS[_CATEGORY_RANKS[index]]
 
     def _rs(self, dv01=None, dv05=None, dv09=None):
         if dv01 == None:
@@ -3595,6 +3611,38 @@ class AtomizationModel:
         return self._params_for_nozzle(nozzle, "Angle")
 
 
+# Category lookup arrays for AtomizationModel.classify_*, in ref_nozzles order.
+# Rank, name and color arrays carry a trailing no-category entry, indexed by -1
+_CATEGORY_BOUNDS = {
+    key: (
+        np.array([c[key][0] for c in AtomizationModel.ref_nozzles.values()]),
+        max(c[key][1] for c in AtomizationModel.ref_nozzles.values()),
+    )
+    for key in ["DV01", "DV05", "DV09"]
+}
+_CATEGORY_RANKS = np.array(
+    [c["RANK"] for c in AtomizationModel.ref_nozzles.values()] + [-1]
+)
+_CATEGORY_NAMES = np.array(
+    [
+        name
+        for _, name in sorted(
+            (c["RANK"], name) for name, c in AtomizationModel.ref_nozzles.items()
+        )
+    ]
+    + [""]
+)
+_CATEGORY_COLORS = np.array(
+    [
+        color
+        for _, color in sorted(
+            (c["RANK"], c["Color"]) for c in AtomizationModel.ref_nozzles.values()
+        )
+    ]
+    + ["#FFFFFF"]
+)
+
+
 class AtomizationModelMulti(AtomizationModel):
     def __init__(self):
         self.nozzleSets = []
@@ -1,4 +1,3 @@
-from numpy import TooHardError
 import accupatt.config as cfg
 from accupatt.models.sprayCard import SprayCard
 from PyQt6.QtCore import (
@@ -64,7 +63,9 @@ class CardStatTableModel(QAbstractTableModel):
         if role == Qt.ItemDataRole.TextAlignmentRole:
             return Qt.AlignmentFlag.AlignCenter.value
         card: SprayCard = self.card_list[index.row()]
-        alpha = 128 if card.has_image and not card.stats.get_dsc() == "" else 0
+        # Stats values are read from the card's snapshot, rebuilt only after processing
+        stats = card.stats.snapshot()
+        alpha = 128 if card.has_image and not stats.dsc == "" else 0
         col = index.column()
         if col == 0:
             if role == Qt.ItemDataRole.DisplayRole:
@@ -94,51 +95,59 @@ class CardStatTableModel(QAbstractTableModel):
                 return cfg.UNITS_LENGTH_LARGE.index(card.location_units)
         elif col == 4:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_dsc()
+                return stats.dsc
             if role == Qt.ItemDataRole.BackgroundRole:
-                hex_color = card.stats.get_dsc_color()
+                hex_color = stats.dsc_color
                 qcolor = QColor(hex_color)
                 qcolor.setAlpha(alpha)
                 return QBrush(qcolor)
         elif col == 5:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_dv01(text=True)
+                return stats.dv01_text
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return stats.dv01_ci_text
             if role == Qt.ItemDataRole.BackgroundRole:
-                hex_color = card.stats.get_dv01_color()
+                hex_color = stats.dv01_color
                 qcolor = QColor(hex_color)
                 qcolor.setAlpha(alpha)
                 return QBrush(qcolor)
         elif col == 6:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_dv05(text=True)
+                return stats.dv05_text
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return stats.dv05_ci_text
             if role == Qt.ItemDataRole.BackgroundRole:
-                hex_color = card.stats.get_dv05_color()
+                hex_color = stats.dv05_color
                 qcolor = QColor(hex_color)
                 qcolor.setAlpha(alpha)
                 return QBrush(qcolor)
         elif col == 7:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_dv09(text=True)
+                return stats.dv09_text
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return stats.dv09_ci_text
             if role == Qt.ItemDataRole.BackgroundRole:
-                hex_color = card.stats.get_dv09_color()
+                hex_color = stats.dv09_color
                 qcolor = QColor(hex_color)
                 qcolor.setAlpha(alpha)
                 return QBrush(qcolor)
         elif col == 8:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_relative_span(text=True)
+                return stats.relative_span_text
         elif col == 9:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_deposition(text=True)
+                return stats.deposition_text()
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return stats.deposition_ci_text()
         elif col == 10:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_percent_coverage(text=True)
+                return stats.coverage_text
         elif col == 11:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_number_of_stains(text=True)
+                return stats.number_of_stains_text
         elif col == 12:
             if role == Qt.ItemDataRole.DisplayRole:
-                return card.stats.get_stains_per_in2(text=True)
+                return stats.stains_per_in2_text
         else:
             return QVariant()
 
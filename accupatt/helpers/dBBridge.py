@@ -1,11 +1,19 @@
+import contextlib
+import hashlib
+import json
 import os
+import pathlib
 import sqlite3
+import threading
 import alembic.config
 import alembic.command
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import accupatt.config as cfg
+import accupatt.helpers.imagePyramid as imagePyramid
+from accupatt.helpers.imageCache import image_cache
 from accupatt.models.appInfo import Nozzle
 from accupatt.models.passDataCard import PassDataCard
 from accupatt.models.passData import Pass
@@ -14,10 +22,16 @@ from accupatt.models.seriesDataCard import SeriesDataCard
 from accupatt.models.seriesData import SeriesData
 from accupatt.models.seriesDataString import SeriesDataString
 from accupatt.models.sprayCard import SprayCard
+from accupatt.models.stainTable import StainTable
 
 schema_filename = os.path.join(os.getcwd(), "resources", "schema.sql")
 alembic_ini = os.path.join(os.getcwd(), "resources", "alembic.ini")
 
+# Read-only connection for card image reads, kept while its file is open along
+# with the file's identity when opened and a lock serializing reads on it
+_image_connections: dict[str, tuple[sqlite3.Connection, tuple, threading.Lock]] = {}
+_image_connections_lock = threading.Lock()
+
 
 """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """''
 Loading
@@ -25,6 +39,8 @@ Loading
 
 
 def load_from_db(file: str, s: SeriesData, load_only_info=False):
+    # Reopen image reads on the file as migrated
+    close_image_connections(file)
     # Use Alembic to convert db to most current
     alembic_args = [
         "--raiseerr",
@@ -34,6 +50,8 @@ def load_from_db(file: str, s: SeriesData, load_only_info=False):
         "head",
     ]
     alembic.config.main(argv=alembic_args)
+    # File may have changed on disk since any images were cached from it
+    image_cache.invalidate(file)
     # Opens a file connection to the db
     with sqlite3.connect(file) as conn:
         # Get a cursor object
@@ -227,6 +245,7 @@ def _load_table_passes(c: sqlite3.Cursor, s: SeriesData, file: str):
         _load_table_pass_string(c, p)
         _load_table_pass_spray_card(c, p)
         _load_table_spray_cards(c, p, file)
+        _load_table_spray_card_stains(c, p)
 
         s.passes.append(p)
 
@@ -277,7 +296,7 @@ def _load_table_pass_spray_card(c: sqlite3.Cursor, p: Pass):
 def _load_table_spray_cards(c: sqlite3.Cursor, p: Pass, file: str):
     # Spray Cards Table
     c.execute(
-        """SELECT id, name, location, location_units, include_in_composite, threshold_type, threshold_method_grayscale, threshold_grayscale, threshold_color_hue_min, threshold_color_hue_max, threshold_color_hue_pass, threshold_color_saturation_min, threshold_color_saturation_max, threshold_color_saturation_pass, threshold_color_brightness_min, threshold_color_brightness_max, threshold_color_brightness_pass, watershed, min_stain_area_px, stain_approximation_method, dpi, spread_method, spread_factor_a, spread_factor_b, spread_factor_c, has_image FROM spray_cards WHERE pass_id = ?""",
+        """SELECT id, name, location, location_units, include_in_composite, threshold_type, threshold_method_grayscale, threshold_grayscale, threshold_color_hue_min, threshold_color_hue_max, threshold_color_hue_pass, threshold_color_saturation_min, threshold_color_saturation_max, threshold_color_saturation_pass, threshold_color_brightness_min, threshold_color_brightness_max, threshold_color_brightness_pass, watershed, segmentation_engine, min_stain_area_px, stain_approximation_method, dpi, spread_method, spread_factor_a, spread_factor_b, spread_factor_c, has_image FROM spray_cards WHERE pass_id = ?""",
         (p.id,),
     )
     cards = c.fetchall()
@@ -302,6 +321,7 @@ def _load_table_spray_cards(c: sqlite3.Cursor, p: Pass, file: str):
             bmax,
             bpass,
             sc.watershed,
+            sc.segmentation_engine,
             sc.min_stain_area_px,
             sc.stain_approximation_method,
             sc.dpi,
@@ -317,16 +337,121 @@ def _load_table_spray_cards(c: sqlite3.Cursor, p: Pass, file: str):
         p.cards.card_list.append(sc)
 
 
-def load_image_from_db(file: str, spray_card_id: str) -> bytearray:
-    byte_array = None
-    with sqlite3.connect(file) as conn:
-        # Get a cursor object
-        c = conn.cursor()
+def _load_table_spray_card_stains(c: sqlite3.Cursor, p: Pass):
+    # Restore stains and stats cached at last save, valid only if image and options unchanged
+    c.execute(
+        """SELECT st.spray_card_id, st.image_hash, st.cache_key, st.threshold_grayscale_calculated, st.flag_max_stain_limit_reached, st.area_px2, st.dv01, st.dv05, st.dv09, st.gpa, st.lpha, st.stains, st.confidence_intervals FROM spray_card_stains st JOIN spray_cards sc ON sc.id = st.spray_card_id WHERE sc.pass_id = ?""",
+        (p.id,),
+    )
+    cards = {sc.id: sc for sc in p.cards.card_list}
+    for row in c.fetchall():
+        sc: SprayCard = cards.get(row[0])
+        if sc is None or not sc.has_image or row[2] != sc.processing_key(row[1]):
+            continue
+        (
+            _,
+            _,
+            _,
+            sc.threshold_grayscale_calculated,
+            sc.flag_max_stain_limit_reached,
+            sc.area_px2,
+            dv01,
+            dv05,
+            dv09,
+            gpa,
+            lpha,
+            stains,
+            confidence_intervals,
+        ) = row
+        sc.flag_max_stain_limit_reached = bool(sc.flag_max_stain_limit_reached)
+        sc.stains = StainTable.from_bytes(stains)
+        sc.stains_segmentation_params = sc.segmentation_params()
+        # NaN stats (no valid stains) are stored as NULL
+        sc.stats.dv01 = np.nan if dv01 is None else dv01
+        sc.stats.dv05 = np.nan if dv05 is None else dv05
+        sc.stats.dv09 = np.nan if dv09 is None else dv09
+        sc.stats.gpa = np.nan if gpa is None else gpa
+        sc.stats.lpha = np.nan if lpha is None else lpha
+        # Stored as json, NULL unless bootstrapped (resample count is in the key)
+        sc.stats.confidence_intervals = (
+            None
+            if confidence_intervals is None
+            else {k: tuple(v) for k, v in json.loads(confidence_intervals).items()}
+        )
+        sc.current = True
+        sc.stats.current = True
+
+
+def load_image_from_db(file: str, spray_card_id: str) -> tuple[bytes, str]:
+    # Blob as read by sqlite, for decoding in place (see imageCodec.decode)
+    with _image_cursor(file) as c:
         # SprayCard Table entry matching supplied card id
-        c.execute("""SELECT image FROM spray_cards WHERE id = ?""", (spray_card_id,))
-        # blob to byte array
-        byte_array = bytearray(c.fetchone()[0])
-    return byte_array
+        c.execute(
+            """SELECT image, image_codec FROM spray_cards WHERE id = ?""",
+            (spray_card_id,),
+        )
+        ((image, codec),) = c.fetchall()
+    return image, codec
+
+
+def load_thumbnail_levels_from_db(file: str, spray_card_id: str) -> np.ndarray:
+    # Rows of level, width, height of the reduced levels stored for the card
+    with _image_cursor(file) as c:
+        c.execute(
+            """SELECT level, width, height FROM spray_card_thumbnails WHERE spray_card_id = ? ORDER BY level""",
+            (spray_card_id,),
+        )
+        rows = c.fetchall()
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+
+def load_thumbnail_from_db(
+    file: str, spray_card_id: str, level: int
+) -> tuple[bytes, str]:
+    with _image_cursor(file) as c:
+        c.execute(
+            """SELECT image, image_codec FROM spray_card_thumbnails WHERE spray_card_id = ? AND level = ?""",
+            (spray_card_id, level),
+        )
+        ((image, codec),) = c.fetchall()
+    return image, codec
+
+
+def close_image_connections(file: str = None):
+    # Close the image read connection to file, or to every file, i.e. when the
+    # file is closed, migrated or replaced. Reads in progress finish first
+    with _image_connections_lock:
+        closing = [
+            _image_connections.pop(f)
+            for f in list(_image_connections)
+            if file is None or f == file
+        ]
+    for conn, _, lock in closing:
+        with lock:
+            conn.close()
+
+
+@contextlib.contextmanager
+def _image_cursor(file: str):
+    # Cursor on the file's image read connection, opened on first read. Reads
+    # from loader threads share it one at a time and are read to completion,
+    # so no read lock is held between reads to block saving. A file replaced on
+    # disk since the connection was opened (i.e. deleted and created again) is
+    # reopened
+    st = os.stat(file)
+    identity = (st.st_dev, st.st_ino, st.st_ctime_ns)
+    with _image_connections_lock:
+        conn, opened, lock = _image_connections.get(file, (None, None, None))
+        if opened != identity:
+            if conn is not None:
+                with lock:
+                    conn.close()
+            uri = pathlib.Path(os.path.abspath(file)).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            lock = threading.Lock()
+            _image_connections[file] = (conn, identity, lock)
+    with lock:
+        yield conn.cursor()
 
 
 """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """""" """''
@@ -368,6 +493,7 @@ def save_to_db(file: str, s: SeriesData):
             _update_table_spray_system(c, s)
             _update_table_nozzles(c, s)
             _update_table_passes(c, s)
+            _update_table_spray_card_stains(c, s)
             return True
     return False
 
@@ -611,9 +737,9 @@ def _update_table_spray_cards(c: sqlite3.Cursor, p: Pass):
     card: SprayCard
     for card in p.cards.card_list:
         c.execute(
-            """INSERT INTO spray_cards (id, pass_id, name, location, location_units, include_in_composite, threshold_type, threshold_method_grayscale, threshold_grayscale, threshold_color_hue_min, threshold_color_hue_max, threshold_color_hue_pass, threshold_color_saturation_min, threshold_color_saturation_max, threshold_color_saturation_pass, threshold_color_brightness_min, threshold_color_brightness_max, threshold_color_brightness_pass, watershed, min_stain_area_px, stain_approximation_method, dpi, spread_method, spread_factor_a, spread_factor_b, spread_factor_c, has_image) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """INSERT INTO spray_cards (id, pass_id, name, location, location_units, include_in_composite, threshold_type, threshold_method_grayscale, threshold_grayscale, threshold_color_hue_min, threshold_color_hue_max, threshold_color_hue_pass, threshold_color_saturation_min, threshold_color_saturation_max, threshold_color_saturation_pass, threshold_color_brightness_min, threshold_color_brightness_max, threshold_color_brightness_pass, watershed, segmentation_engine, min_stain_area_px, stain_approximation_method, dpi, spread_method, spread_factor_a, spread_factor_b, spread_factor_c, has_image) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                         ON CONFLICT(id) DO UPDATE SET
-                        name = excluded.name, location = excluded.location, location_units = excluded.location_units, include_in_composite = excluded.include_in_composite, threshold_type = excluded.threshold_type, threshold_method_grayscale = excluded.threshold_method_grayscale, threshold_grayscale = excluded.threshold_grayscale, threshold_color_hue_min = excluded.threshold_color_hue_min, threshold_color_hue_max = excluded.threshold_color_hue_max, threshold_color_hue_pass = excluded.threshold_color_hue_pass, threshold_color_saturation_min = excluded.threshold_color_saturation_min, threshold_color_saturation_max = excluded.threshold_color_saturation_max, threshold_color_saturation_pass = excluded.threshold_color_saturation_pass, threshold_color_brightness_min = excluded.threshold_color_brightness_min, threshold_color_brightness_max = excluded.threshold_color_brightness_max, threshold_color_brightness_pass = excluded.threshold_color_brightness_pass, watershed = excluded.watershed, min_stain_area_px = excluded.min_stain_area_px, stain_approximation_method = excluded.stain_approximation_method, dpi = excluded.dpi, spread_method = excluded.spread_method, spread_factor_a = excluded.spread_factor_a, spread_factor_B = excluded.spread_factor_b, spread_factor_c = excluded.spread_factor_c, has_image = excluded.has_image""",
+                        name = excluded.name, location = excluded.location, location_units = excluded.location_units, include_in_composite = excluded.include_in_composite, threshold_type = excluded.threshold_type, threshold_method_grayscale = excluded.threshold_method_grayscale, threshold_grayscale = excluded.threshold_grayscale, threshold_color_hue_min = excluded.threshold_color_hue_min, threshold_color_hue_max = excluded.threshold_color_hue_max, threshold_color_hue_pass = excluded.threshold_color_hue_pass, threshold_color_saturation_min = excluded.threshold_color_saturation_min, threshold_color_saturation_max = excluded.threshold_color_saturation_max, threshold_color_saturation_pass = excluded.threshold_color_saturation_pass, threshold_color_brightness_min = excluded.threshold_color_brightness_min, threshold_color_brightness_max = excluded.threshold_color_brightness_max, threshold_color_brightness_pass = excluded.threshold_color_brightness_pass, watershed = excluded.watershed, segmentation_engine = excluded.segmentation_engine, min_stain_area_px = excluded.min_stain_area_px, stain_approximation_method = excluded.stain_approximation_method, dpi = excluded.dpi, spread_method = excluded.spread_method, spread_factor_a = excluded.spread_factor_a, spread_factor_B = excluded.spread_factor_b, spread_factor_c = excluded.spread_factor_c, has_image = excluded.has_image""",
             (
                 card.id,
                 p.id,
@@ -634,6 +760,7 @@ def _update_table_spray_cards(c: sqlite3.Cursor, p: Pass):
                 card.threshold_color_brightness_max,
                 card.threshold_color_brightness_pass,
                 card.watershed,
+                card.segmentation_engine,
                 card.min_stain_area_px,
                 card.stain_approximation_method,
                 card.dpi,
@@ -661,15 +788,144 @@ def _update_table_spray_cards(c: sqlite3.Cursor, p: Pass):
         )
 
 
-def save_image_to_db(file: str, spray_card_id: str, image) -> bool:
+def _update_table_spray_card_stains(c: sqlite3.Cursor, s: SeriesData):
+    card: SprayCard
+    for p in s.passes:
+        for card in p.cards.card_list:
+            # Only cache cards whose stains and stats are up to date
+            if not (card.has_image and card.current and card.stats.current):
+                continue
+            # Image hash is kept until the image is overwritten, see save_image_to_db
+            c.execute(
+                """SELECT image_hash FROM spray_card_stains WHERE spray_card_id = ?""",
+                (card.id,),
+            )
+            if (row := c.fetchone()) and row[0]:
+                image_hash = row[0]
+            else:
+                c.execute("""SELECT image FROM spray_cards WHERE id = ?""", (card.id,))
+                if (row := c.fetchone()) is None or row[0] is None:
+                    continue
+                image_hash = hashlib.sha256(row[0]).hexdigest()
+            c.execute(
+                """INSERT INTO spray_card_stains (spray_card_id, image_hash, cache_key, threshold_grayscale_calculated, flag_max_stain_limit_reached, area_px2, dv01, dv05, dv09, gpa, lpha, stains, confidence_intervals) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(spray_card_id) DO UPDATE SET
+                    image_hash = excluded.image_hash, cache_key = excluded.cache_key, threshold_grayscale_calculated = excluded.threshold_grayscale_calculated, flag_max_stain_limit_reached = excluded.flag_max_stain_limit_reached, area_px2 = excluded.area_px2, dv01 = excluded.dv01, dv05 = excluded.dv05, dv09 = excluded.dv09, gpa = excluded.gpa, lpha = excluded.lpha, stains = excluded.stains, confidence_intervals = excluded.confidence_intervals""",
+                (
+                    card.id,
+                    image_hash,
+                    card.processing_key(image_hash),
+                    int(card.threshold_grayscale_calculated),
+                    int(card.flag_max_stain_limit_reached),
+                    float(card.area_px2),
+                    _int_or_none(card.stats.dv01),
+                    _int_or_none(card.stats.dv05),
+                    _int_or_none(card.stats.dv09),
+                    _float_or_none(card.stats.gpa),
+                    _float_or_none(card.stats.lpha),
+                    sqlite3.Binary(card.stains.to_bytes()),
+                    None
+                    if card.stats.confidence_intervals is None
+                    else json.dumps(card.stats.confidence_intervals),
+                ),
+            )
+    # Drop cache entries and thumbnails of cards no longer in the series
+    c.execute(
+        """DELETE FROM spray_card_stains WHERE spray_card_id NOT IN (SELECT id FROM spray_cards)"""
+    )
+    c.execute(
+        """DELETE FROM spray_card_thumbnails WHERE spray_card_id NOT IN (SELECT id FROM spray_cards)"""
+    )
+
+
+def _int_or_none(value):
+    return None if value is None or np.isnan(value) else int(value)
+
+
+def _float_or_none(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def save_thumbnails_to_db(file: str, spray_card_id: str, img: np.ndarray) -> bool:
+    # Build and store the reduced levels of a stored image from its decode, for
+    # images saved without them (i.e. before levels were stored)
+    with sqlite3.connect(file) as conn:
+        c = conn.cursor()
+        c.execute(
+            """SELECT image_codec FROM spray_cards WHERE id = ?""", (spray_card_id,)
+        )
+        if (row := c.fetchone()) is None:
+            return False
+        levels = imagePyramid.build(img, row[0], cfg.get_image_png_compression())
+        _insert_thumbnails(c, {spray_card_id: levels}, row[0], replace=False)
+    return True
+
+
+def _insert_thumbnails(
+    c: sqlite3.Cursor, thumbnails: dict, codec: str = None, replace: bool = True
+):
+    # Levels keyed by spray card id, see imagePyramid.build. Without replace any
+    # levels already stored (i.e. built concurrently) are kept
+    c.executemany(
+        f"""INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO spray_card_thumbnails (spray_card_id, level, width, height, image, image_codec) VALUES (?, ?, ?, ?, ?, ?)""",
+        [
+            (
+                id,
+                level,
+                width,
+                height,
+                None if blob is None else sqlite3.Binary(blob),
+                imagePyramid.thumbnail_codec(codec),
+            )
+            for id, levels in thumbnails.items()
+            for level, width, height, blob in levels
+        ],
+    )
+
+
+def save_image_to_db(
+    file: str, spray_card_id: str, image, codec: str = None, thumbnails: list = None
+) -> bool:
+    return save_images_to_db(
+        file,
+        {spray_card_id: image},
+        codec,
+        None if thumbnails is None else {spray_card_id: thumbnails},
+    )
+
+
+def save_images_to_db(
+    file: str, images: dict, codec: str = None, thumbnails: dict = None
+) -> bool:
+    # Write images keyed by spray card id, all in one transaction. Images are
+    # encoded with codec (see imageCodec), None for image files. Each image's
+    # reduced levels (see imagePyramid) are replaced with those given, those not
+    # given are built on first read, see save_thumbnails_to_db
+    thumbnails = {} if thumbnails is None else thumbnails
     success = False
     with sqlite3.connect(file) as conn:
         # Get a cursor object
         c = conn.cursor()
-        # Request update of card record in table spray_cards by sprayCard.id
-        c.execute(
-            """UPDATE spray_cards SET image = ? WHERE id = ?""",
-            (sqlite3.Binary(image), spray_card_id),
+        # Request update of card records in table spray_cards by sprayCard.id
+        c.executemany(
+            """UPDATE spray_cards SET image = ?, image_codec = ? WHERE id = ?""",
+            [(sqlite3.Binary(image), codec, id) for id, image in images.items()],
+        )
+        # New images invalidate any cached stains
+        c.executemany(
+            """DELETE FROM spray_card_stains WHERE spray_card_id = ?""",
+            [(id,) for id in images],
+        )
+        # And replace the reduced levels of the old images
+        c.executemany(
+            """DELETE FROM spray_card_thumbnails WHERE spray_card_id = ?""",
+            [(id,) for id in images],
+        )
+        _insert_thumbnails(
+            c, {id: thumbnails[id] for id in images if id in thumbnails}, codec
         )
         success = True
+    # As well as any decode of the old images
+    for id in images:
+        image_cache.invalidate(file, id)
     return success
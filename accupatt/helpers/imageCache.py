@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import accupatt.config as cfg
+
+
+class ImageCache:
+    """
+    Size-bounded LRU cache of decoded card images, keyed by file, card id and a
+    version which is bumped on invalidate, so a stale decode is never returned
+    after its image is overwritten. Arrays derived from an image (i.e. grayscale,
+    histogram) are cached alongside it under a variant name and invalidated with
+    it. Images are copied in and out so callers are free to draw on what they get back,
+    callers only reading an image may instead share the cached one, read-only.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        # Budget read from config on first use if not given
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._versions: dict[tuple, int] = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        file: str,
+        card_id: str,
+        loader=None,
+        variant: str = "image",
+        copy: bool = True,
+    ) -> np.ndarray:
+        """
+        Returns a copy of the cached image, or on a miss the result of loader()
+        (also cached) if supplied, else None. Without copy a read-only view of
+        the cached image is returned, so no second copy is held. Read-only
+        loader results are cached as they are.
+        """
+        with self._lock:
+            key = self._key(file, card_id, variant)
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image.copy() if copy else self._readonly(image)
+            self.misses += 1
+        if loader is None or (image := loader()) is None:
+            return image
+        self.put(file, card_id, image, variant=variant, key=key, copy=copy)
+        if copy:
+            return image if image.flags.writeable else image.copy()
+        return self._readonly(image)
+
+    def put(
+        self,
+        file: str,
+        card_id: str,
+        image: np.ndarray,
+        variant: str = "image",
+        key: tuple = None,
+        copy: bool = True,
+    ):
+        with self._lock:
+            # Drop the put if the card was invalidated while it was being decoded
+            if key is None:
+                key = self._key(file, card_id, variant)
+            elif key != self._key(file, card_id, variant):
+                return
+            if image.nbytes > self.max_bytes:
+                return
+            self._remove(key)
+            # Images nobody can write to need no copy of their own
+            self._entries[key] = (
+                image.copy() if copy and image.flags.writeable else image
+            )
+            self._nbytes += image.nbytes
+            while self._nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, file: str, card_id: str = None):
+        # Invalidate one card, or every card of file if no card_id given
+        with self._lock:
+            self._versions[(file, card_id)] = self._versions.get((file, card_id), 0) + 1
+            for key in list(self._entries):
+                if key[0] == file and (card_id is None or key[1] == card_id):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is None:
+            self._max_bytes = cfg.get_image_cache_mb() * 1024 * 1024
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        self._max_bytes = value
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def _key(self, file: str, card_id: str, variant: str) -> tuple:
+        # File-wide and card versions, so either kind of invalidate orphans the entry
+        return (
+            file,
+            card_id,
+            variant,
+            self._versions.get((file, None), 0),
+            self._versions.get((file, card_id), 0),
+        )
+
+    def _readonly(self, image: np.ndarray) -> np.ndarray:
+        view = image.view()
+        view.flags.writeable = False
+        return view
+
+    def _remove(self, key: tuple):
+        if (image := self._entries.pop(key, None)) is not None:
+            self._nbytes -= image.nbytes
+
+
+# Process-wide instance used by sprayCardImageFileHandler
+image_cache = ImageCache()
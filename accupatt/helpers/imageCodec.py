@@ -0,0 +1,56 @@
+"""
+Card images are stored in one of cfg.IMAGE_CODECS, recorded per card. Raw
+stores the pixel planes as an .npy buffer, trading disk for no decode at all.
+Images stored before codecs were recorded (codec None) are image files, in
+whatever format they were loaded from
+"""
+import io
+
+import cv2
+import numpy as np
+
+import accupatt.config as cfg
+
+# Longest .npy header read, far above that of any image shape
+_NPY_HEADER_MAX = 64 * 1024
+
+
+def encode(
+    img: np.ndarray,
+    codec: str = cfg.IMAGE_CODEC__DEFAULT,
+    png_compression: int = cfg.IMAGE_PNG_COMPRESSION__DEFAULT,
+):
+    if codec == cfg.IMAGE_CODEC_PNG:
+        return cv2.imencode(
+            ".png", img, [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        )[1]
+    if codec == cfg.IMAGE_CODEC_WEBP:
+        # Quality above 100 selects lossless
+        return cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, 101])[1]
+    if codec == cfg.IMAGE_CODEC_RAW:
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(img), allow_pickle=False)
+        return buffer.getbuffer()
+    raise ValueError(f"Unknown image codec {codec}")
+
+
+def decode(blob, codec: str = None) -> np.ndarray:
+    # blob is any bytes-like object, read in place without copying. Raw pixel
+    # planes are a view of blob, read-only if blob is (i.e. bytes from sqlite)
+    if codec == cfg.IMAGE_CODEC_RAW:
+        return _view_npy(blob)
+    return cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _view_npy(blob) -> np.ndarray:
+    buffer = memoryview(blob)
+    # Only the header is read through a file, see np.lib.format
+    fp = io.BytesIO(buffer[: min(len(buffer), _NPY_HEADER_MAX)])
+    version = np.lib.format.read_magic(fp)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+    return np.frombuffer(
+        buffer, dtype=dtype, count=int(np.prod(shape)), offset=fp.tell()
+    ).reshape(shape, order="F" if fortran_order else "C")
@@ -0,0 +1,65 @@
+"""
+Reduced resolution levels of a card image, stored with it so previews need not
+decode the full image. Level n is the image halved n times, levels are made
+until the longest side is within MIN_SIZE. Level 0 is the card image itself,
+stored only as its size
+"""
+import cv2
+import numpy as np
+
+import accupatt.config as cfg
+import accupatt.helpers.imageCodec as imageCodec
+
+MIN_SIZE = 256
+
+
+def thumbnail_codec(codec: str = None) -> str:
+    # Image files (codec None) get PNG levels
+    return cfg.IMAGE_CODEC_PNG if codec is None else codec
+
+
+def build(
+    img: np.ndarray,
+    codec: str = None,
+    png_compression: int = cfg.IMAGE_PNG_COMPRESSION__DEFAULT,
+) -> list[tuple[int, int, int, bytes]]:
+    # (level, width, height, encoded image) of each level, each resized from the
+    # one above. Level 0 has no image of its own
+    codec = thumbnail_codec(codec)
+    levels = [(0, img.shape[1], img.shape[0], None)]
+    level = 0
+    while max(img.shape[:2]) > MIN_SIZE and min(img.shape[:2]) >= 2:
+        height, width = img.shape[0] // 2, img.shape[1] // 2
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+        level += 1
+        levels.append(
+            (level, width, height, imageCodec.encode(img, codec, png_compression))
+        )
+    return levels
+
+
+def encode(
+    img: np.ndarray,
+    codec: str = cfg.IMAGE_CODEC__DEFAULT,
+    png_compression: int = cfg.IMAGE_PNG_COMPRESSION__DEFAULT,
+) -> tuple[bytes, list]:
+    # Encoded image and its levels, as saved by save_images_to_db
+    return imageCodec.encode(img, codec, png_compression), build(
+        img, codec, png_compression
+    )
+
+
+def level_for(levels: np.ndarray, size: float) -> int:
+    # Smallest level (rows of level, width, height) whose longest side covers
+    # size, 0 for full resolution if none does
+    covering = [int(l) for l, w, h in levels if max(w, h) >= size]
+    return max(covering, default=0)
+
+
+def scale_of(levels: np.ndarray, level: int) -> float:
+    # Width of level relative to full resolution, from rows of level, width,
+    # height. Halving floors odd sizes, so this is not exactly 0.5**level
+    widths = {int(l): int(w) for l, w, h in levels}
+    if level == 0 or 0 not in widths:
+        return 1.0
+    return widths[level] / widths[0]
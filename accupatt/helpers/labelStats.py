@@ -0,0 +1,106 @@
+import copy
+
+import numpy as np
+from scipy import ndimage
+from skimage.morphology import convex_hull_image
+
+
+class LabelStats:
+    """
+    Per-label measurements of a label image, as parallel arrays in label order.
+    Area, bbox, centroid and second order central moments are gathered for all
+    labels at once with bincount, axis lengths and orientation follow from the
+    moments as in skimage regionprops. Label masks and convex hulls are only
+    built per label when asked for.
+    """
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+        h, w = labels.shape
+        flat = labels.ravel()
+        idx = np.flatnonzero(flat)
+        lab = flat[idx]
+        rows, cols = np.divmod(idx, w)
+        counts = np.bincount(lab)
+        self.label = np.flatnonzero(counts[1:]) + 1
+        self.area = counts[self.label]
+        # (min_row, min_col, max_row, max_col), as skimage
+        slices = ndimage.find_objects(labels)
+        self.bbox = np.array(
+            [
+                (s[0].start, s[1].start, s[0].stop, s[1].stop)
+                for s in (slices[i - 1] for i in self.label)
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        # Pixel coordinates from each label's bbox corner, so measurements come
+        # out the same wherever the label lies in the image
+        origin = np.zeros((len(counts), 2), dtype=np.int64)
+        origin[self.label] = self.bbox[:, :2]
+        rows -= origin[lab, 0]
+        cols -= origin[lab, 1]
+        # Centroid as (row, col)
+        n = counts.clip(min=1)
+        mean_r = np.bincount(lab, weights=rows) / n
+        mean_c = np.bincount(lab, weights=cols) / n
+        self.centroid = (
+            np.column_stack((mean_r[self.label], mean_c[self.label])) + self.bbox[:, :2]
+        )
+        # Central moments normalized by area, taken about each label's centroid
+        dr = rows - mean_r[lab]
+        dc = cols - mean_c[lab]
+        self.mu_rr = (np.bincount(lab, weights=dr * dr) / n)[self.label]
+        self.mu_cc = (np.bincount(lab, weights=dc * dc) / n)[self.label]
+        self.mu_rc = (np.bincount(lab, weights=dr * dc) / n)[self.label]
+
+    def __len__(self) -> int:
+        return len(self.label)
+
+    def take(self, mask) -> "LabelStats":
+        # Subset of the labels, still measured against the same label image
+        subset = copy.copy(self)
+        for name in ["label", "area", "centroid", "mu_rr", "mu_cc", "mu_rc", "bbox"]:
+            setattr(subset, name, getattr(self, name)[mask])
+        return subset
+
+    def first_pixels(self) -> np.ndarray:
+        # Flat (raster order) index of each label's first pixel
+        flat = self.labels.ravel()
+        idx = np.flatnonzero(flat)
+        first = np.full(flat.max() + 1, flat.size, dtype=np.int64)
+        np.minimum.at(first, flat[idx], idx)
+        return first[self.label]
+
+    def _inertia_eigvals(self) -> tuple[np.ndarray, np.ndarray]:
+        # Inertia tensor is [[mu_cc, -mu_rc], [-mu_rc, mu_rr]]
+        half_trace = (self.mu_cc + self.mu_rr) / 2
+        root = np.sqrt(((self.mu_cc - self.mu_rr) / 2) ** 2 + self.mu_rc**2)
+        return (half_trace + root).clip(min=0), (half_trace - root).clip(min=0)
+
+    @property
+    def axis_major_length(self) -> np.ndarray:
+        return 4 * np.sqrt(self._inertia_eigvals()[0])
+
+    @property
+    def axis_minor_length(self) -> np.ndarray:
+        return 4 * np.sqrt(self._inertia_eigvals()[1])
+
+    @property
+    def orientation(self) -> np.ndarray:
+        a, b, c = self.mu_cc, -self.mu_rc, self.mu_rr
+        angle = 0.5 * np.arctan2(-2 * b, c - a)
+        return np.where(a - c == 0, np.where(b < 0, -np.pi / 4, np.pi / 4), angle)
+
+    def image(self, i: int) -> np.ndarray:
+        # Mask of label i within its bbox
+        r0, c0, r1, c1 = self.bbox[i]
+        return self.labels[r0:r1, c0:c1] == self.label[i]
+
+    def image_convex(self, i: int) -> np.ndarray:
+        return convex_hull_image(self.image(i))
+
+    def area_convex(self) -> np.ndarray:
+        return np.array(
+            [np.count_nonzero(self.image_convex(i)) for i in range(len(self))],
+            dtype=np.int64,
+        )
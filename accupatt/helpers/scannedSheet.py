@@ -0,0 +1,192 @@
+import io
+import operator
+from functools import cached_property
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class ScannedSheet:
+    """
+    A scanned sheet of spray cards. The file is read and decoded once, the DPI
+    is taken from the same bytes and a reduced level of the decoded image serves
+    both the on-screen preview and card detection. Card rectangles found on the
+    reduced level are refined at full resolution along their edges only.
+    """
+
+    # Longest side of the reduced level
+    REDUCED_MAX_SIZE = 4096
+
+    def __init__(self, image_file: str, flip_x=False, flip_y=False):
+        self.image_file = image_file
+        self.data = np.fromfile(image_file, dtype=np.uint8)
+        self.flip_x = flip_x
+        self.flip_y = flip_y
+
+    @cached_property
+    def dpi(self) -> int:
+        # Header only, None if the file does not record it. Large scans trip
+        # PIL's decompression bomb check, which does not apply to a header read
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(io.BytesIO(self.data)) as img:
+                dpi = img.info.get("dpi")
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+        return round(dpi[0]) if dpi else None
+
+    @cached_property
+    def image(self) -> np.ndarray:
+        img = cv2.imdecode(self.data, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("not a supported image file")
+        return self._flip(img, self.flip_x, self.flip_y)
+
+    @cached_property
+    def reduction(self) -> int:
+        # Power of 2 bringing the longest side within REDUCED_MAX_SIZE
+        factor = 1
+        while max(self.image.shape[:2]) > factor * self.REDUCED_MAX_SIZE:
+            factor *= 2
+        return factor
+
+    @cached_property
+    def reduced(self) -> np.ndarray:
+        f = self.reduction
+        if f == 1:
+            return self.image
+        h, w = self.image.shape[:2]
+        return cv2.resize(self.image, (w // f, h // f), interpolation=cv2.INTER_AREA)
+
+    def set_flip(self, flip_x: bool, flip_y: bool):
+        # Flip decoded images in place of decoding again
+        if "image" in self.__dict__:
+            self.image = self._flip(
+                self.image, flip_x != self.flip_x, flip_y != self.flip_y
+            )
+        self.__dict__.pop("reduced", None)
+        self.flip_x = flip_x
+        self.flip_y = flip_y
+
+    def crop(self, rect) -> np.ndarray:
+        # View of the full resolution image within (x, y, w, h)
+        x, y, w, h = rect
+        return self.image[y : y + h, x : x + w]
+
+    def find_rois(self) -> list[tuple[int, int, int, int]]:
+        """
+        Rectangles (x, y, w, h) in full resolution pixels of the cards on the sheet
+        """
+        img = self.reduced
+        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        threshold, img_thresh = cv2.threshold(
+            img_gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
+        )
+        # Use img_thresh to find contours
+        contours, _ = cv2.findContours(
+            img_thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
+        )
+
+        roi_rectangles = []
+        for c in contours:
+            # Check if in bounds
+            x, y, w, h = cv2.boundingRect(c)
+            # If bounding box is less than 5% of w or h of image, reject it
+            if w < 0.05 * img.shape[1] or h < 0.05 * img.shape[0]:
+                continue
+            # If contour touches edge, fail
+            if (
+                x <= 0
+                or y <= 0
+                or (x + w) >= img.shape[1] - 1
+                or (y + h) >= img.shape[0] - 1
+            ):
+                continue
+            roi_rectangles.append(self._refine(x, y, w, h, threshold))
+        return roi_rectangles
+
+    def _refine(self, x, y, w, h, threshold) -> tuple[int, int, int, int]:
+        # Scale a reduced level rectangle to full resolution, then move each edge
+        # to the outermost stain pixel within a band one reduced pixel either side
+        f = self.reduction
+        left, top, right, bottom = x * f, y * f, (x + w) * f, (y + h) * f
+        if f == 1:
+            return left, top, right - left, bottom - top
+        rows = slice(top, bottom)
+        cols = slice(left, right)
+        left = self._edge(rows, slice(left - f, left + f), 0, threshold, left, True)
+        right = self._edge(rows, slice(right - f, right + f), 0, threshold, right)
+        top = self._edge(slice(top - f, top + f), cols, 1, threshold, top, True)
+        bottom = self._edge(slice(bottom - f, bottom + f), cols, 1, threshold, bottom)
+        return left, top, right - left, bottom - top
+
+    def _edge(self, rows, cols, axis, threshold, coarse, leading=False) -> int:
+        band = cv2.cvtColor(self.image[rows, cols], cv2.COLOR_BGR2GRAY)
+        hits = np.flatnonzero((band <= threshold).any(axis=axis))
+        if len(hits) == 0:
+            return coarse
+        start = cols.start if axis == 0 else rows.start
+        return int(start + (hits[0] if leading else hits[-1] + 1))
+
+    def _flip(self, img, flip_x: bool, flip_y: bool) -> np.ndarray:
+        if flip_x:
+            img = cv2.flip(img, 1)
+        if flip_y:
+            img = cv2.flip(img, 0)
+        return img
+
+
+def sort_rois(roi_rectangles: list, orientation: str, order: str) -> list:
+    """
+    Orders card rectangles (x, y, w, h) in rows (orientation "Horizontal") or
+    columns, starting from the one nearest the origin
+    """
+    rois_original = roi_rectangles.copy()
+    rois_sorted = []
+    # Loop through all rois, removing from old list as added to new sorted list
+    while len(rois_sorted) < len(roi_rectangles):
+        # Compute distance from origin for each
+        dists_from_origin = []
+        for r in rois_original:
+            x, y, w, h = r
+            dists_from_origin.append(np.sqrt(x**2 + y**2))
+        # Sort rois by dist to origin, grab one nearest origin
+        x1, y1, w1, h1 = [r for _, r in sorted(zip(dists_from_origin, rois_original))][
+            0
+        ]
+        # Create intermediate list for current row/column of first_roi
+        current = []
+        for r in rois_original:
+            x, y, w, h = r
+            # Check if in same row/col as first_roi, if so add to list
+            if orientation == "Horizontal":
+                y_c = y + h / 2
+                if y_c >= y1 and y_c <= y1 + h1:
+                    current.append(r)
+            else:
+                x_c = x + w / 2
+                if x_c >= x1 and x_c <= x1 + w1:
+                    current.append(r)
+        # Sort current row/col list
+        current = sorted(
+            current,
+            key=operator.itemgetter(0 if orientation == "Horizontal" else 1),
+            reverse=(order == "Decreasing"),
+        )
+        # Add sorted row/column to either beginning or end of new list
+        if order == "Decreasing":
+            rois_sorted[0:0] = current
+        else:
+            rois_sorted.extend(current)
+        # Remove current row/col rois from original list
+        rois_original = [r for r in rois_original if r not in current]
+    return rois_sorted
+
+
+def scale_roi(rect, scale: int) -> tuple[int, int, int, int]:
+    # Scale a rectangle by scale percent about its center, as the ROIs drawn by LoadCards
+    x, y, w, h = rect
+    w_s, h_s = round(w * scale / 100), round(h * scale / 100)
+    return x + (w - w_s) // 2, y + (h - h_s) // 2, w_s, h_s
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+from skimage.segmentation import watershed
+
+
+def label(
+    image_t, watershed: bool, min_distance: int, exclude_border=None, regions=None
+) -> np.ndarray:
+    """
+    Labels the stains of thresholded image image_t, background is 0.
+    exclude_border ((top, bottom), (left, right)) sets how close to each side
+    watershed markers may be, min_distance all around by default. regions,
+    (rows, cols) slices of image_t apart from one another with only background
+    outside them, are each segmented as if they were a separate image
+    """
+    if watershed:
+        if exclude_border is None:
+            exclude_border = ((min_distance, min_distance),) * 2
+        return _watershed_labels(image_t, min_distance, exclude_border, regions)
+    _, labels = cv2.connectedComponents(image_t, connectivity=8, ltype=cv2.CV_32S)
+    return labels
+
+
+def distance_transform(image_t, regions=None) -> np.ndarray:
+    """
+    Exact euclidean distance of each stain pixel to background, within each of
+    regions if given
+    """
+    if regions is not None:
+        # Stains at a region's edge are measured as at an image edge
+        distance = np.zeros(image_t.shape, np.float32)
+        for region in regions:
+            distance[region] = distance_transform(np.ascontiguousarray(image_t[region]))
+        return distance
+    distance = cv2.distanceTransform(image_t, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    # Results vary in the last bits with the buffer's memory alignment, which is
+    # enough to move watershed markers. Snap to the root of the integer squared
+    # distance so the same stain always gets the same markers
+    np.square(distance, out=distance)
+    np.rint(distance, out=distance)
+    return np.sqrt(distance, out=distance)
+
+
+def _watershed_labels(
+    image_t, min_distance: int, exclude_border, regions=None
+) -> np.ndarray:
+    distance = distance_transform(image_t, regions)
+    # Markers at local maxima of distance to background, the same as the
+    # reference's peak_local_max finds, by default not within min_distance of
+    # the image border
+    peaks = np.zeros(image_t.shape, dtype=bool)
+    for rows, cols in regions or [(slice(None), slice(None))]:
+        peaks[rows, cols] = _local_maxima(
+            distance[rows, cols], min_distance, exclude_border
+        )
+    # Keep one peak per min_distance neighborhood, highest first
+    coords = _spaced_peaks(np.column_stack(np.nonzero(peaks)), distance, min_distance)
+    markers = np.zeros(image_t.shape, np.int32)
+    markers[coords[:, 0], coords[:, 1]] = np.arange(1, len(coords) + 1)
+    # A stain holding one marker is all its basin, one holding none is left
+    # unlabeled, as the reference floods with 4-connectivity
+    n, components = cv2.connectedComponents(image_t, connectivity=4, ltype=cv2.CV_32S)
+    marker_components = components[coords[:, 0], coords[:, 1]]
+    owner = np.zeros(n, np.int32)
+    owner[marker_components] = np.arange(1, len(coords) + 1)
+    count = np.bincount(marker_components, minlength=n)
+    count[0] = 0
+    labels = np.where(count[components] == 1, owner[components], 0)
+    # Only stains split between markers are flooded, over inverted distance with
+    # the reference's watershed. cv2.watershed orders pixels by their difference
+    # to a labeled neighbor rather than by height, which no relief scaling makes
+    # agree with it
+    shared = count[components] > 1
+    if shared.any():
+        rows, cols = np.nonzero(shared)
+        box = slice(rows.min(), rows.max() + 1), slice(cols.min(), cols.max() + 1)
+        flooded = watershed(
+            -distance[box],
+            np.where(shared[box], markers[box], 0),
+            mask=shared[box],
+            watershed_line=True,
+        )
+        labels[box] = np.where(shared[box], flooded, labels[box])
+    return labels
+
+
+def _local_maxima(distance, min_distance: int, exclude_border) -> np.ndarray:
+    size = 2 * min_distance + 1
+    h, w = distance.shape
+    (top, bottom), (left, right) = exclude_border
+    inner = distance[top : h - bottom, left : w - right]
+    inner_max = cv2.dilate(
+        inner, np.ones((size, size), np.uint8), borderType=cv2.BORDER_REPLICATE
+    )
+    peaks = np.zeros(distance.shape, dtype=bool)
+    peaks[top : h - bottom, left : w - right] = (inner == inner_max) & (inner > 0)
+    return peaks
+
+
+def _spaced_peaks(coords, distance, min_distance: int) -> np.ndarray:
+    # Greedy suppression of peaks closer than min_distance (chebyshev) to a
+    # higher one, ties in raster order, as skimage ensure_spacing
+    order = np.argsort(-distance[coords[:, 0], coords[:, 1]], kind="stable")
+    coords = coords[order]
+    tree = cKDTree(coords)
+    keep = np.ones(len(coords), dtype=bool)
+    for i, neighbors in enumerate(
+        tree.query_ball_point(coords, r=min_distance - 0.5, p=np.inf)
+    ):
+        if keep[i]:
+            keep[[n for n in neighbors if n > i]] = False
+    return coords[keep]
@@ -0,0 +1,94 @@
+import copy
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import accupatt.config as cfg
+from accupatt.helpers.imageCache import image_cache
+from accupatt.models.sprayCard import SprayCard, SprayCardStats
+from accupatt.models.stainTable import StainTable
+
+
+# Worker-side entry points, must live at module level so they may be pickled.
+# Workers are given every setting they use, they may not read the user's config
+def _init_worker(image_cache_mb: int):
+    image_cache.max_bytes = image_cache_mb * 1024 * 1024
+
+
+def _process_card(
+    sprayCard: SprayCard, memory_mb: int, bootstrap_resamples: int
+) -> SprayCard:
+    sprayCard.process_image(memory_mb=memory_mb)
+    sprayCard.stats.set_volumetric_stats(bootstrap_resamples=bootstrap_resamples)
+    return sprayCard
+
+
+class SprayCardProcessPool:
+    """
+    Runs SprayCardImageProcessor over a list of cards using a pool of worker
+    processes. Each worker gets a detached copy of a card and returns it processed,
+    the results are then applied to the original card objects as they complete.
+    """
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = cfg.get_card_process_workers()
+        self.max_workers = max(1, max_workers)
+        self.executor: ProcessPoolExecutor = None
+        # Exception raised processing each failed card, by index in cards
+        self.failed: dict[int, Exception] = {}
+
+    def process(self, cards: list[SprayCard], poll_interval: float = 0.1):
+        """
+        Generator yielding the index (in cards) of each card as it finishes processing.
+        Yields None every poll_interval seconds while waiting, so the caller may
+        keep the ui responsive and check for cancellation. Cards which fail are
+        left not current and recorded in failed, the rest carry on.
+        """
+        self.failed = {}
+        self.executor = ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(cards)),
+            initializer=_init_worker,
+            initargs=(cfg.get_image_cache_mb(),),
+        )
+        memory_mb = cfg.get_processing_memory_mb()
+        bootstrap_resamples = cfg.get_bootstrap_resamples()
+        try:
+            futures = {
+                self.executor.submit(
+                    _process_card,
+                    self._detached_copy(card),
+                    memory_mb,
+                    bootstrap_resamples,
+                ): i
+                for i, card in enumerate(cards)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(
+                    pending, timeout=poll_interval, return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    yield None
+                for future in done:
+                    i = futures[future]
+                    try:
+                        cards[i].apply_processing_results(future.result())
+                    except Exception as e:
+                        self.failed[i] = e
+                        cards[i].current = False
+                        cards[i].stats.current = False
+                    yield i
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        # Drop any queued cards, cards already in a worker are left to finish and discarded
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _detached_copy(self, card: SprayCard) -> SprayCard:
+        # Only ship processing options to the worker, not the previous stain list
+        c = copy.copy(card)
+        c.stains = StainTable()
+        c.stats = SprayCardStats(sprayCard=c)
+        return c
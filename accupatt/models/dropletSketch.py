@@ -0,0 +1,145 @@
+import numpy as np
+
+
+class DropletSketch:
+    """
+    Mergeable summary of a card's droplet spectrum. Included droplets are counted
+    into fixed log-spaced diameter bins, with the droplet volume and stain area
+    summed per bin, so sketches of any set of cards merge by adding arrays.
+    Volume sums are exact, DVs land within one bin width (0.46%) of those
+    interpolated over the individual droplets
+    """
+
+    BINS_PER_DECADE = 500
+    # Diameters outside [MIN_UM, MAX_UM) are counted in the first/last bin
+    MIN_UM = 1.0
+    MAX_UM = 10000.0
+
+    EDGES = np.geomspace(
+        MIN_UM,
+        MAX_UM,
+        int(round(np.log10(MAX_UM / MIN_UM) * BINS_PER_DECADE)) + 1,
+    )
+    CENTERS = np.sqrt(EDGES[:-1] * EDGES[1:])
+
+    # Per-bin arrays and card totals, all merged by summation
+    ARRAYS = ("count", "volume_um3", "stain_area_px2")
+    TOTALS = ("coverage_px2", "area_px2", "area_in2")
+
+    def __init__(
+        self,
+        count=None,
+        volume_um3=None,
+        stain_area_px2=None,
+        coverage_px2: float = 0.0,
+        area_px2: float = 0.0,
+        area_in2: float = 0.0,
+    ):
+        n = len(self.CENTERS)
+        self.count = np.zeros(n, dtype=np.int64) if count is None else count
+        self.volume_um3 = np.zeros(n) if volume_um3 is None else volume_um3
+        # Stain area of included stains, for coverage by droplet size
+        self.stain_area_px2 = np.zeros(n) if stain_area_px2 is None else stain_area_px2
+        # Stain area of included and edge stains, for percent coverage
+        self.coverage_px2 = coverage_px2
+        # Card area
+        self.area_px2 = area_px2
+        self.area_in2 = area_in2
+
+    @classmethod
+    def from_droplets(
+        cls,
+        drop_dia_um,
+        drop_vol_um3,
+        stain_area_px2,
+        coverage_px2: float,
+        area_px2: float,
+        area_in2: float,
+    ) -> "DropletSketch":
+        n = len(cls.CENTERS)
+        bins = np.searchsorted(cls.EDGES, drop_dia_um, side="right") - 1
+        bins = bins.clip(0, n - 1)
+        return cls(
+            count=np.bincount(bins, minlength=n),
+            volume_um3=np.bincount(bins, weights=drop_vol_um3, minlength=n),
+            stain_area_px2=np.bincount(bins, weights=stain_area_px2, minlength=n),
+            coverage_px2=coverage_px2,
+            area_px2=area_px2,
+            area_in2=area_in2,
+        )
+
+    @classmethod
+    def merge(cls, sketches: list["DropletSketch"]) -> "DropletSketch":
+        merged = cls()
+        for s in sketches:
+            for name in cls.ARRAYS:
+                getattr(merged, name)[:] += getattr(s, name)
+            for name in cls.TOTALS:
+                setattr(merged, name, getattr(merged, name) + getattr(s, name))
+        return merged
+
+    def number_of_droplets(self) -> int:
+        return int(self.count.sum())
+
+    def volume_sum_um3(self) -> float:
+        return float(self.volume_um3.sum())
+
+    def dv(self, fractions) -> np.ndarray:
+        # Diameters below which the given fractions of volume lie, interpolating
+        # cumulative volume between occupied bins as is done between droplets
+        occupied = np.flatnonzero(self.count)
+        if len(occupied) == 0:
+            return np.full(np.shape(fractions), np.nan)
+        volume_cum = np.cumsum(self.volume_um3[occupied])
+        return np.interp(
+            np.asarray(fractions) * volume_cum[-1],
+            volume_cum,
+            self.CENTERS[occupied],
+        )
+
+    def histogram(self, bins) -> tuple[np.ndarray, np.ndarray]:
+        # Stain area fraction and droplet count in linear diameter bins given by
+        # their lower edges, the last bin taking everything above it
+        index = (np.searchsorted(bins, self.CENTERS, side="right") - 1).clip(
+            0, len(bins) - 1
+        )
+        binned_area = np.bincount(
+            index, weights=self.stain_area_px2, minlength=len(bins)
+        )
+        binned_count = np.bincount(index, weights=self.count, minlength=len(bins))
+        area_sum = binned_area.sum()
+        if area_sum > 0:
+            binned_area /= area_sum
+        return binned_area, binned_count.astype(np.int64)
+
+    def bootstrap(
+        self, resamples: int, fractions, seed: int = 0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # DVs (resamples x fractions) and volume sums of droplet sets resampled
+        # with replacement, all at once. Droplets are drawn by bin, taking the
+        # bin's mean volume, as a multinomial over the occupied bins
+        occupied = np.flatnonzero(self.count)
+        counts = self.count[occupied]
+        n = counts.sum()
+        rows = np.arange(resamples)[:, None]
+        rng = np.random.default_rng(seed)
+        weights = rng.multinomial(n, counts / n, size=resamples)
+        volume_cum = np.cumsum(weights * (self.volume_um3[occupied] / counts), axis=1)
+        volume_sum = volume_cum[:, -1]
+        # Diameters to interpolate between, each empty bin of a resample taking
+        # that of the last drawn bin before it, so it adds no point of its own
+        drawn = weights > 0
+        last = np.maximum.accumulate(
+            np.where(drawn, np.arange(len(occupied)), -1), axis=1
+        )
+        first = drawn.argmax(axis=1)[:, None]
+        centers = self.CENTERS[occupied][np.where(last < 0, first, last)]
+        # Interpolate every resample in one pass, offsetting each by its row so
+        # the normalized cumulative volumes are increasing end to end. A leading
+        # point per row clamps fractions below its first drawn bin
+        xp = np.concatenate((rows, volume_cum / volume_sum[:, None] + rows), axis=1)
+        fp = np.concatenate((centers[rows, first], centers), axis=1)
+        dv = np.interp(
+            (np.asarray(fractions)[None, :] + rows).ravel(), xp.ravel(), fp.ravel()
+        ).reshape(resamples, -1)
+        return dv, volume_sum
@@ -16,8 +16,9 @@ class PassDataCard(PassDataBase):
         # Card Data
         self.card_list: list[SprayCard] = []
 
-    def _get_data_from_card_list(self):
-        scs: list[SprayCard] = sorted(
+    def located_cards(self) -> list[SprayCard]:
+        # Cards used for plots and composites that have a location, in location order
+        return sorted(
             [
                 card
                 for card in self.card_list
@@ -28,6 +29,9 @@ class PassDataCard(PassDataBase):
             ],
             key=lambda x: x.location,
         )
+
+    def _get_data_from_card_list(self):
+        scs = self.located_cards()
         return pd.DataFrame(
             {
                 "name": [card.name for card in scs],
@@ -182,12 +186,7 @@ class PassDataCard(PassDataBase):
                         d["loc"], d["dv05"], kind=kind, fill_value="extrapolate"
                     )
                     dv05_i = interpolator(locs_i)
-                    dsc_i = np.array(
-                        [
-                            AtomizationModel().dsc(dv01=dv01, dv05=dv05)
-                            for (dv01, dv05) in zip(dv01_i, dv05_i)
-                        ]
-                    )
+                    dsc_i = AtomizationModel.classify_dsc(dv01_i, dv05_i)
                     # Plot the fill data using dsc-specified colors
                     categories = list(AtomizationModel.ref_nozzles)
                     colors = [
@@ -1,16 +1,26 @@
+import copy
 from dataclasses import dataclass
+import hashlib
 import math
+import sqlite3
 import uuid
 
 import accupatt.config as cfg
 import cv2
 from skimage.draw import ellipse_perimeter
 from skimage.feature import peak_local_max
-from skimage.measure import find_contours, label as sklabel, regionprops
+from skimage.measure import find_contours, label as sklabel
 from skimage.segmentation import watershed
 from scipy import ndimage
 import numpy as np
 from accupatt.helpers.atomizationModel import AtomizationModel
+from accupatt.helpers.imageCache import image_cache
+import accupatt.helpers.imageCodec as imageCodec
+import accupatt.helpers.imagePyramid as imagePyramid
+from accupatt.helpers.labelStats import LabelStats
+import accupatt.helpers.segmentationOpenCV as segmentationOpenCV
+from accupatt.models.dropletSketch import DropletSketch
+from accupatt.models.stainTable import StainTable
 
 
 class SprayCard:
@@ -41,6 +51,7 @@ class SprayCard:
         self.threshold_color_brightness_max = cfg.get_threshold_hsb_brightness_max()
         self.threshold_color_brightness_pass = cfg.get_threshold_hsb_brightness_pass()
         self.watershed = cfg.get_watershed()
+        self.segmentation_engine = cfg.get_segmentation_engine()
         self.min_stain_area_px = cfg.get_min_stain_area_px()
         self.stain_approximation_method = cfg.get_stain_approximation_method()
         self.spread_method = cfg.get_spread_factor_equation()
@@ -50,21 +61,52 @@ class SprayCard:
         # Initialize stain stats
         self.flag_max_stain_limit_reached = False
         self.area_px2 = 0.0
-        self.stains = []
+        self.stains = StainTable()
         self.stats = SprayCardStats(sprayCard=self)
+        # Segmentation options the current stains were generated with, see update_stains
+        self.stains_segmentation_params = None
         # Flag for currency
         self.current = False
         # Temporary working variable
         self.threshold_grayscale_calculated = cfg.get_threshold_grayscale()
 
-    def image_original(self):
-        return sprayCardImageFileHandler.read_image_from_file(self)
+    def image_original(self, copy: bool = True):
+        # Without copy the image is shared with the cache, read-only
+        return sprayCardImageFileHandler.read_image_from_file(self, copy)
 
-    def process_image(self, overlay=False, mask=False):
+    def image_grayscale(self):
+        return sprayCardImageFileHandler.read_derived_image(
+            self, "grayscale", lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        )
+
+    def image_hsv(self):
+        return sprayCardImageFileHandler.read_derived_image(
+            self, "hsv", lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        )
+
+    def grayscale_histogram(self) -> np.ndarray:
+        # 256-bin pixel count, cached with the image so thresholds can be evaluated in O(256)
+        return sprayCardImageFileHandler.read_derived_image(
+            self,
+            "grayscale_histogram",
+            lambda img: SprayCardImageProcessor.grayscale_histogram(
+                cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            ),
+        )
+
+    def grayscale_coverage(self) -> np.ndarray:
+        # Percent of card pixels at or below each grayscale threshold 0-255
+        return SprayCardImageProcessor.threshold_coverage(self.grayscale_histogram())
+
+    def process_image(self, overlay=False, mask=False, memory_mb: int = None):
         self.current = True
-        scip = SprayCardImageProcessor(sprayCard=self)
+        scip = SprayCardImageProcessor(
+            sprayCard=self, stats_only=not (overlay or mask), memory_mb=memory_mb
+        )
         self.threshold_grayscale_calculated = scip.threshold_grayscale_calculated
         scip.process_stains()
+        self.stains_segmentation_params = self.segmentation_params()
+        self.stats.clear_snapshot()
         if overlay and mask:
             return scip.get_overlay_image(), scip.get_mask_image()
         elif overlay:
@@ -72,8 +114,103 @@ class SprayCard:
         elif mask:
             return scip.get_mask_image()
 
-    def save_image_to_file(self, image):
-        return sprayCardImageFileHandler.save_image_to_file(self, image)
+    def image_thumbnail(self, size: float) -> tuple[np.ndarray, float]:
+        # Smallest stored level of the image (see imagePyramid) with longest side
+        # covering size, and its width relative to the original image
+        return sprayCardImageFileHandler.read_thumbnail(self, size)
+
+    def preview_image(self, max_size: int):
+        # Overlay and mask of a downsampled working copy, this card's stains are left as-is
+        preview = copy.copy(self)
+        img, scale = self.image_thumbnail(max_size)
+        scip = SprayCardImageProcessor(
+            sprayCard=preview,
+            max_size=max_size,
+            img_src=None if scale == 1.0 else img,
+            img_scale=scale,
+        )
+        self.threshold_grayscale_calculated = scip.threshold_grayscale_calculated
+        scip.process_stains()
+        return scip.get_overlay_image(), scip.get_mask_image()
+
+    def needs_segmentation(self) -> bool:
+        return self.stains_segmentation_params != self.segmentation_params()
+
+    def update_stains(self):
+        # Only rerun the full image pipeline if a segmentation option has changed,
+        # otherwise re-filter the existing stains for the current min area
+        if self.needs_segmentation():
+            self.process_image()
+        else:
+            self.stains.classify(self.min_stain_area_px)
+            self.stats.clear_snapshot()
+            self.current = True
+
+    def apply_processing_results(self, processed: "SprayCard"):
+        # Adopt stains and stats from a copy of this card processed elsewhere (i.e. in a worker process)
+        self.threshold_grayscale_calculated = processed.threshold_grayscale_calculated
+        self.flag_max_stain_limit_reached = processed.flag_max_stain_limit_reached
+        self.area_px2 = processed.area_px2
+        self.stains = processed.stains
+        self.stains_segmentation_params = processed.stains_segmentation_params
+        self.stats = processed.stats
+        self.stats.sprayCard = self
+        self.current = processed.current
+
+    def segmentation_params(self) -> tuple:
+        # Options used by thresholding, labeling and stain approximation
+        return (
+            self.threshold_type,
+            self.threshold_method_grayscale,
+            self.threshold_grayscale,
+            self.threshold_color_hue_min,
+            self.threshold_color_hue_max,
+            self.threshold_color_hue_pass,
+            self.threshold_color_saturation_min,
+            self.threshold_color_saturation_max,
+            self.threshold_color_saturation_pass,
+            self.threshold_color_brightness_min,
+            self.threshold_color_brightness_max,
+            self.threshold_color_brightness_pass,
+            self.watershed,
+            self.segmentation_engine,
+            self.stain_approximation_method,
+        )
+
+    def classification_params(self) -> tuple:
+        # Options used to filter stains once segmented
+        return (self.min_stain_area_px,)
+
+    def stats_params(self) -> tuple:
+        # Options used only by volumetric stats
+        return (
+            self.dpi,
+            self.spread_method,
+            self.spread_factor_a,
+            self.spread_factor_b,
+            self.spread_factor_c,
+        )
+
+    def processing_key(self, image_hash: str) -> str:
+        # Hash of image content and every option affecting stains or volumetric stats
+        params = (
+            self.segmentation_params()
+            + self.classification_params()
+            + self.stats_params()
+        )
+        # Cached confidence intervals depend on the resample count, keys made
+        # without bootstrapping are left as they were
+        if (resamples := cfg.get_bootstrap_resamples()) > 0:
+            params += (resamples,)
+        # Normalize numerics so values read back from the db (i.e. 1 vs True) match
+        params = [
+            float(p) if isinstance(p, (bool, int, float, np.number)) else p
+            for p in params
+        ]
+        return hashlib.sha256(repr([image_hash] + params).encode()).hexdigest()
+
+    def save_image_to_file(self, image, codec: str = None):
+        return sprayCardImageFileHandler.save_image_to_file(self, image, codec)
 
     def set_filepath(self, filepath):
         self.filepath = filepath
@@ -114,6 +251,46 @@ class SprayCard:
             self.threshold_color_brightness_pass = bandpass
 
 
+@dataclass(frozen=True)
+class SprayCardStatsSnapshot:
+    """
+    Display text and colors of a card's stats, taken once per processing run so
+    tables may repaint without rescanning stains
+    """
+
+    dsc: str
+    dsc_color: str
+    dv01_text: str
+    dv01_color: str
+    dv05_text: str
+    dv05_color: str
+    dv09_text: str
+    dv09_color: str
+    relative_span_text: str
+    gpa_text: str
+    lpha_text: str
+    coverage_text: str
+    number_of_stains_text: str
+    card_area_in2_text: str
+    stains_per_in2_text: str
+    # Confidence intervals, empty unless bootstrapped
+    dv01_ci_text: str = ""
+    dv05_ci_text: str = ""
+    dv09_ci_text: str = ""
+    gpa_ci_text: str = ""
+    lpha_ci_text: str = ""
+
+    def deposition_text(self) -> str:
+        if cfg.get_unit_rate() == cfg.UNIT_LPHA:
+            return self.lpha_text
+        return self.gpa_text
+
+    def deposition_ci_text(self) -> str:
+        if cfg.get_unit_rate() == cfg.UNIT_LPHA:
+            return self.lpha_ci_text
+        return self.gpa_ci_text
+
+
 @dataclass
 class SprayCardStats:
 
@@ -127,6 +304,15 @@ class SprayCardStats:
 
     # Flag for currency
     current = False
+    # Droplet diameter and volume arrays with the stains and options they came from
+    _droplets = None
+    # Droplet sketch with the droplet arrays it was built from
+    _sketch = None
+    # Bootstrap (low, high) bounds of dv01, dv05, dv09, gpa and lpha, None when
+    # not resampled
+    confidence_intervals = None
+    # Display values, see snapshot
+    _snapshot = None
 
     # Public value/text getters
 
@@ -192,21 +378,20 @@ class SprayCardStats:
             return self.lpha
 
     def get_percent_coverage(self, text=False):
-        stains = [s for s in self.sprayCard.stains if s["is_include"] or s["is_edge"]]
+        stains = self.sprayCard.stains
+        mask = stains.is_include | stains.is_edge
         # Protect from div/0 error or empty stain array
-        if self.sprayCard.area_px2 == 0 or len(stains) == 0:
+        if self.sprayCard.area_px2 == 0 or not mask.any():
             return 0
         # Calculate coverage as percent of pixel area
-        cov = (
-            sum([stain["area"] for stain in stains]) / self.sprayCard.area_px2
-        ) * 100.0
+        cov = (stains.area[mask].sum() / self.sprayCard.area_px2) * 100.0
         if text:
             return f"{cov:.2f}%"
         else:
             return cov
 
     def get_number_of_stains(self, text=False):
-        l = len([s for s in self.sprayCard.stains if s["is_include"]])
+        l = int(np.count_nonzero(self.sprayCard.stains.is_include))
         if text:
             return str(l)
         else:
@@ -228,40 +413,86 @@ class SprayCardStats:
         else:
             return spsi
 
+    def get_confidence_interval(self, name: str, text=False):
+        if self.confidence_intervals is None:
+            return "" if text else None
+        low, high = self.confidence_intervals[name]
+        if text:
+            level = f"{cfg.BOOTSTRAP_CONFIDENCE:.0%} CI"
+            if name.startswith("dv"):
+                return f"{level}: {low:.0f} - {high:.0f} \u03BCm"
+            return f"{level}: {low:.2f} - {high:.2f}"
+        else:
+            return low, high
+
     def get_minimum_detectable_droplet_diameter(self):
         min_stain_area = self._px2_to_um2(self.sprayCard.min_stain_area_px)
         min_stain_dia = math.sqrt((4.0 * min_stain_area) / math.pi)
         return round(self._stain_dia_to_drop_dia(min_stain_dia))
 
+    def snapshot(self) -> SprayCardStatsSnapshot:
+        # Built on first use after each processing run
+        if self._snapshot is None:
+            self._snapshot = SprayCardStatsSnapshot(
+                dsc=self.get_dsc(),
+                dsc_color=self.get_dsc_color(),
+                dv01_text=self.get_dv01(text=True),
+                dv01_color=self.get_dv01_color(),
+                dv05_text=self.get_dv05(text=True),
+                dv05_color=self.get_dv05_color(),
+                dv09_text=self.get_dv09(text=True),
+                dv09_color=self.get_dv09_color(),
+                relative_span_text=self.get_relative_span(text=True),
+                gpa_text=self._get_gpa(text=True),
+                lpha_text=self._get_lpha(text=True),
+                coverage_text=self.get_percent_coverage(text=True),
+                number_of_stains_text=self.get_number_of_stains(text=True),
+                card_area_in2_text=self.get_card_area_in2(text=True),
+                stains_per_in2_text=self.get_stains_per_in2(text=True),
+                dv01_ci_text=self.get_confidence_interval("dv01", text=True),
+                dv05_ci_text=self.get_confidence_interval("dv05", text=True),
+                dv09_ci_text=self.get_confidence_interval("dv09", text=True),
+                gpa_ci_text=self.get_confidence_interval("gpa", text=True),
+                lpha_ci_text=self.get_confidence_interval("lpha", text=True),
+            )
+        return self._snapshot
+
+    def clear_snapshot(self):
+        self._snapshot = None
+
     # Public setter for dv's
 
-    def set_volumetric_stats(self, drop_dia_um=None, drop_vol_um3=None):
+    def set_volumetric_stats(self, bootstrap_resamples: int = None):
+        self.clear_snapshot()
         # Protect agains empty array
-        if not any([s["is_include"] for s in self.sprayCard.stains]):
-            self.dv01 = np.nan
-            self.dv05 = np.nan
-            self.dv09 = np.nan
-            self.gpa = np.nan
-            self.lpha = np.nan
+        if not self.sprayCard.stains.is_include.any():
+            self._clear_volumetric_stats()
             return
-        # dd and dv lists normally none, but will have values already for composite card calcs
-        if drop_dia_um is None or drop_vol_um3 is None:
-            drop_dia_um, drop_vol_um3 = self.get_droplet_diameters_and_volumes()
-        # Calculate volume sum
-        drop_vol_um3_sum = sum(drop_vol_um3)
-        # Calculate volume fractions
-        dv01_vol = 0.10 * drop_vol_um3_sum
-        dv05_vol = 0.50 * drop_vol_um3_sum
-        dv09_vol = 0.90 * drop_vol_um3_sum
-        # Convert lists to np arrays
-        drop_dia_um = np.array(drop_dia_um, dtype=float, order="K")
-        drop_vol_um3 = np.array(drop_vol_um3, dtype=float, order="K")
-        # Create cumulative volume array
+        drop_dia_um, drop_vol_um3 = self.get_droplet_diameters_and_volumes()
+        # Create cumulative volume array, last entry is the volume sum
         drop_vol_um3_cum = np.cumsum(drop_vol_um3)
+        drop_vol_um3_sum = drop_vol_um3_cum[-1]
         # Interpolate drop diameters using volume fractions
-        self.dv01 = round(np.interp(dv01_vol, drop_vol_um3_cum, drop_dia_um))
-        self.dv05 = round(np.interp(dv05_vol, drop_vol_um3_cum, drop_dia_um))
-        self.dv09 = round(np.interp(dv09_vol, drop_vol_um3_cum, drop_dia_um))
+        dv01, dv05, dv09 = np.interp(
+            np.array([0.10, 0.50, 0.90]) * drop_vol_um3_sum,
+            drop_vol_um3_cum,
+            drop_dia_um,
+        )
+        self._set_volumetric_stats(dv01, dv05, dv09, drop_vol_um3_sum)
+        self._set_confidence_intervals(self.get_droplet_sketch(), bootstrap_resamples)
+
+    def _clear_volumetric_stats(self):
+        self.dv01 = np.nan
+        self.dv05 = np.nan
+        self.dv09 = np.nan
+        self.gpa = np.nan
+        self.lpha = np.nan
+        self.confidence_intervals = None
+
+    def _set_volumetric_stats(self, dv01, dv05, dv09, drop_vol_um3_sum):
+        self.dv01 = round(dv01)
+        self.dv05 = round(dv05)
+        self.dv09 = round(dv09)
         # Use the vol sum here to set GPA and L/HA
         um3_per_um2 = drop_vol_um3_sum / self._px2_to_um2(self.sprayCard.area_px2)
         self.gpa = um3_per_um2 / cfg.UM3_UM2_PER_GAL_ACRE
@@ -269,29 +500,75 @@ class SprayCardStats:
         # Reset currency flag
         self.current = True
 
-    # Publicly accessible getter for dd and dv lists, only public so can be used in Composite Card calculations
-
-    def get_droplet_diameters_and_volumes(self) -> tuple[list[float], list[float]]:
-        stains = [s for s in self.sprayCard.stains if s["is_include"]]
-        # Protect agains empty array
-        if not stains:
-            return [], []
-        drop_dia_um = []
-        drop_vol_um3 = []
+    def _set_confidence_intervals(self, sketch: DropletSketch, resamples: int = None):
+        # Percentile intervals over droplet sets resampled from the sketch
+        if resamples is None:
+            resamples = cfg.get_bootstrap_resamples()
+        if resamples <= 0:
+            self.confidence_intervals = None
+            return
+        dv, drop_vol_um3_sum = sketch.bootstrap(resamples, [0.10, 0.50, 0.90])
+        um3_per_um2 = drop_vol_um3_sum / self._px2_to_um2(self.sprayCard.area_px2)
+        tail = (1 - cfg.BOOTSTRAP_CONFIDENCE) / 2 * 100
+        percentiles = [tail, 100 - tail]
+        dv_low, dv_high = np.percentile(dv, percentiles, axis=0)
+        gpa = np.percentile(um3_per_um2 / cfg.UM3_UM2_PER_GAL_ACRE, percentiles)
+        lpha = np.percentile(um3_per_um2 / cfg.UM3_UM2_PER_L_HA, percentiles)
+        self.confidence_intervals = {
+            "dv01": (float(dv_low[0]), float(dv_high[0])),
+            "dv05": (float(dv_low[1]), float(dv_high[1])),
+            "dv09": (float(dv_low[2]), float(dv_high[2])),
+            "gpa": (float(gpa[0]), float(gpa[1])),
+            "lpha": (float(lpha[0]), float(lpha[1])),
+        }
+
+    # Publicly accessible getter for dd and dv arrays, only public so can be used in Composite Card calculations
+
+    def get_droplet_diameters_and_volumes(self) -> tuple[np.ndarray, np.ndarray]:
+        sc = self.sprayCard
+        # Reuse arrays until the stains, their classification or spread/dpi change
+        key = (sc.classification_params(), sc.stats_params())
+        if (
+            self._droplets is not None
+            and self._droplets[0] is sc.stains
+            and self._droplets[1] == key
+        ):
+            return self._droplets[2]
         # Sort areas into ascending order of size
-        stains.sort(key=lambda s: s["area"])
-        for stain in stains:
-            # Convert px2 to um2
-            area_um2 = self._px2_to_um2(stain["area"])
-            # Calculate stain diameter assuming circular stain
-            dia_um = math.sqrt((4.0 * area_um2) / math.pi)
-            # Apply Spread Factors to get originating drop diameter
-            drop_dia_um.append(self._stain_dia_to_drop_dia(dia_um))
-            # Use drop diameter to calculate drop volume
-            vol_um3 = (math.pi * drop_dia_um[-1] ** 3) / 6.0
-            # Build volume list
-            drop_vol_um3.append(vol_um3)
-        return drop_dia_um, drop_vol_um3
+        areas = np.sort(sc.stains.area[sc.stains.is_include])
+        # Convert px2 to um2
+        area_um2 = self._px2_to_um2(areas.astype(np.float64))
+        # Calculate stain diameter assuming circular stain
+        dia_um = np.sqrt((4.0 * area_um2) / np.pi)
+        # Apply Spread Factors to get originating drop diameter
+        drop_dia_um = self._stain_dia_to_drop_dia(dia_um)
+        # Use drop diameter to calculate drop volume
+        drop_vol_um3 = (np.pi * drop_dia_um**3) / 6.0
+        self._droplets = (sc.stains, key, (drop_dia_um, drop_vol_um3))
+        return self._droplets[2]
+
+    # Mergeable summary of the card's droplets, see DropletSketch
+
+    def get_droplet_sketch(self) -> DropletSketch:
+        sc = self.sprayCard
+        droplets = self.get_droplet_diameters_and_volumes()
+        if (
+            self._sketch is not None
+            and self._sketch[0] is droplets
+            and self._sketch[1] == sc.area_px2
+        ):
+            return self._sketch[2]
+        stains = sc.stains
+        sketch = DropletSketch.from_droplets(
+            *droplets,
+            # Same ascending order the droplet arrays were computed in
+            stain_area_px2=np.sort(stains.area[stains.is_include]),
+            coverage_px2=float(stains.area[stains.is_include | stains.is_edge].sum()),
+            area_px2=sc.area_px2,
+            area_in2=self._px2_to_in2(sc.area_px2),
+        )
+        self._sketch = (droplets, sc.area_px2, sketch)
+        return sketch
 
     # Internal Functions
 
@@ -322,21 +599,114 @@ class SprayCardStats:
 
 
 class sprayCardImageFileHandler:
-    def read_image_from_file(sprayCard: SprayCard):
+    def read_image_from_file(sprayCard: SprayCard, copy: bool = True):
         if sprayCard.filepath == None or not sprayCard.has_image:
             return
         if sprayCard.filepath[-1] == "x":
-            return sprayCardImageFileHandler._read_image_from_xlsx(sprayCard=sprayCard)
+            reader = sprayCardImageFileHandler._read_image_from_xlsx
         elif sprayCard.filepath[-1] == "b":
-            return sprayCardImageFileHandler._read_image_from_db(sprayCard=sprayCard)
-        return
+            reader = sprayCardImageFileHandler._read_image_from_db
+        else:
+            return
+        # Decoded images are shared through the process-wide cache
+        return image_cache.get(
+            sprayCard.filepath,
+            sprayCard.id,
+            loader=lambda: reader(sprayCard=sprayCard),
+            copy=copy,
+        )
+
+    def read_derived_image(sprayCard: SprayCard, variant: str, derive):
+        # Arrays computed from the original image, cached alongside it
+        if sprayCard.filepath == None or not sprayCard.has_image:
+            return
+        return image_cache.get(
+            sprayCard.filepath,
+            sprayCard.id,
+            loader=lambda: derive(sprayCard.image_original()),
+            variant=variant,
+        )
 
-    def save_image_to_file(sprayCard: SprayCard, image):
+    def read_thumbnail(sprayCard: SprayCard, size: float):
+        if sprayCard.filepath == None or not sprayCard.has_image:
+            return None, 1.0
+        # Only .db files store reduced levels
+        if sprayCard.filepath[-1] != "b":
+            return sprayCard.image_original(), 1.0
+        from accupatt.helpers.dBBridge import load_thumbnail_from_db
+
+        levels = image_cache.get(
+            sprayCard.filepath,
+            sprayCard.id,
+            loader=lambda: sprayCardImageFileHandler._read_thumbnail_levels(sprayCard),
+            variant="thumbnail_levels",
+        )
+        level = imagePyramid.level_for(levels, size)
+        if level == 0:
+            return sprayCard.image_original(), 1.0
+        return (
+            image_cache.get(
+                sprayCard.filepath,
+                sprayCard.id,
+                loader=lambda: imageCodec.decode(
+                    *load_thumbnail_from_db(sprayCard.filepath, sprayCard.id, level)
+                ),
+                variant=f"thumbnail{level}",
+            ),
+            imagePyramid.scale_of(levels, level),
+        )
+
+    def _read_thumbnail_levels(sprayCard: SprayCard) -> np.ndarray:
+        from accupatt.helpers.dBBridge import (
+            load_thumbnail_levels_from_db,
+            save_thumbnails_to_db,
+        )
+
+        levels = load_thumbnail_levels_from_db(sprayCard.filepath, sprayCard.id)
+        if len(levels) > 0:
+            return levels
+        # Images saved without levels get them on first read
+        img = sprayCard.image_original(copy=False)
+        if img is None:
+            return levels
+        try:
+            save_thumbnails_to_db(sprayCard.filepath, sprayCard.id, img)
+        except sqlite3.Error:
+            # i.e. a read-only file, the original image is used instead
+            return levels
+        return load_thumbnail_levels_from_db(sprayCard.filepath, sprayCard.id)
+
+    def save_image_to_file(
+        sprayCard: SprayCard, image, codec: str = None, thumbnails: list = None
+    ):
+        # image encoded with codec (see imageCodec), None for an image file,
+        # thumbnails its levels if already built (see imagePyramid)
         if sprayCard.filepath == None or sprayCard.filepath == "":
             return
         if sprayCard.filepath[-1] == "b":
             return sprayCardImageFileHandler._write_image_to_db(
-                sprayCard=sprayCard, image=image
+                sprayCard=sprayCard, image=image, codec=codec, thumbnails=thumbnails
+            )
+
+    def save_images_to_file(
+        sprayCards: list[SprayCard],
+        images: list,
+        codec: str = None,
+        thumbnails: list = None,
+    ):
+        # Batch of save_image_to_file, cards sharing a .db file are written together
+        by_file: dict[str, list[int]] = {}
+        for i, sprayCard in enumerate(sprayCards):
+            if sprayCard.filepath == None or sprayCard.filepath == "":
+                continue
+            if sprayCard.filepath[-1] == "b":
+                by_file.setdefault(sprayCard.filepath, []).append(i)
+        for indices in by_file.values():
+            sprayCardImageFileHandler._write_images_to_db(
+                [sprayCards[i] for i in indices],
+                [images[i] for i in indices],
+                codec,
+                None if thumbnails is None else [thumbnails[i] for i in indices],
             )
 
     def _read_image_from_xlsx(sprayCard: SprayCard):
@@ -352,37 +722,152 @@ class sprayCardImageFileHandler:
     def _read_image_from_db(sprayCard: SprayCard):
         from accupatt.helpers.dBBridge import load_image_from_db
 
-        # Get byte array of image from db
-        byte_array = load_image_from_db(sprayCard.filepath, sprayCard.id)
-        # Convert to numpy array
-        image_array = np.asarray(byte_array, dtype="uint8")
-        # Decode the image to a cv2 image
-        return cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        # Decode straight from the stored blob, in the codec it was stored in
+        return imageCodec.decode(*load_image_from_db(sprayCard.filepath, sprayCard.id))
 
-    def _write_image_to_db(sprayCard: SprayCard, image):
-        from accupatt.helpers.dBBridge import save_image_to_db
+    def _write_image_to_db(
+        sprayCard: SprayCard, image, codec: str = None, thumbnails: list = None
+    ):
+        return sprayCardImageFileHandler._write_images_to_db(
+            [sprayCard], [image], codec, None if thumbnails is None else [thumbnails]
+        )
 
-        if success := save_image_to_db(sprayCard.filepath, sprayCard.id, image):
-            sprayCard.has_image = True
-            sprayCard.include_in_composite = True
+    def _write_images_to_db(
+        sprayCards: list[SprayCard],
+        images: list,
+        codec: str = None,
+        thumbnails: list = None,
+    ):
+        from accupatt.helpers.dBBridge import save_images_to_db
+
+        if success := save_images_to_db(
+            sprayCards[0].filepath,
+            {sprayCard.id: image for sprayCard, image in zip(sprayCards, images)},
+            codec,
+            None
+            if thumbnails is None
+            else {
+                sprayCard.id: levels
+                for sprayCard, levels in zip(sprayCards, thumbnails)
+            },
+        ):
+            for sprayCard in sprayCards:
+                # Existing stains no longer belong to this image
+                sprayCard.stains_segmentation_params = None
+                sprayCard.has_image = True
+                sprayCard.include_in_composite = True
         return success
 
 
 class SprayCardImageProcessor:
-    def __init__(self, sprayCard):
+    # Stain classes for rendering
+    _CLASS_BACKGROUND, _CLASS_TOO_SMALL, _CLASS_EDGE, _CLASS_VALID = range(4)
+    # Rough peak memory of segmenting and measuring one pixel (distance transform,
+    # label images and measurement temporaries)
+    _WORKING_BYTES_PER_PIXEL = 64
+
+    def __init__(
+        self,
+        sprayCard,
+        max_size: int = None,
+        stats_only: bool = False,
+        memory_mb: int = None,
+        img_src: np.ndarray = None,
+        img_scale: float = 1.0,
+    ):
         self.sprayCard: SprayCard = sprayCard
+        # Stats only processing drops the label image once stains are measured,
+        # the card may not be drawn
+        self.stats_only = stats_only
+        self.label_stats: LabelStats = None
+        # Rendering arrays, built on first draw
+        self.stain_index: np.ndarray = None
+        self.stain_boundary: np.ndarray = None
         self.threshold_grayscale = self.sprayCard.threshold_grayscale
-        self.img_src = self.sprayCard.image_original()
-        self.threshold_grayscale_calculated, self.img_thresh = self._image_threshold(
-            img=self.img_src
+        # Image given in place of the card's stored one (i.e. its region of a
+        # scanned sheet) has no cached grayscale/hsv variants. The stored image
+        # is shared with the cache when it won't be drawn on
+        self.cached = img_src is None
+        self.img_src = (
+            self.sprayCard.image_original(copy=not stats_only)
+            if self.cached
+            else img_src
         )
+        # Optionally work on a downsampled image (i.e. live previews), pixel
+        # dependent options are scaled to match. An image given may already be
+        # reduced by img_scale (i.e. a stored thumbnail level)
+        self.scale = img_scale
+        if max_size is not None and max(self.img_src.shape[:2]) > max_size:
+            resize = max_size / max(self.img_src.shape[:2])
+            self.scale *= resize
+            self.img_src = cv2.resize(
+                self.img_src,
+                None,
+                fx=resize,
+                fy=resize,
+                interpolation=cv2.INTER_AREA,
+            )
+        self.min_distance = max(1, round(4 * self.scale))
+        # Cards too large to segment whole within the memory budget are processed
+        # in overlapping bands of rows, only possible when not drawing the card.
+        # scikit-image watershed floods in an order set by the whole image, so
+        # its cards are always segmented whole
+        self.tile_rows = None
+        if (
+            stats_only
+            and self.scale == 1.0
+            and not (
+                sprayCard.watershed
+                and sprayCard.segmentation_engine == cfg.SEGMENTATION_ENGINE_SKIMAGE
+            )
+        ):
+            self.tile_rows = self._tile_rows(memory_mb)
+        if self.tile_rows is None:
+            thresholded = self._image_threshold(img=self.img_src)
+        else:
+            thresholded = self._image_threshold_tiled()
+        self.threshold_grayscale_calculated, self.img_thresh = thresholded
         self.sprayCard.area_px2 = self.img_src.shape[0] * self.img_src.shape[1]
-        # Clear stain lists
-        self.sprayCard.stains = []
+        # Clear stain table
+        self.sprayCard.stains = StainTable()
 
     def process_stains(self):
+        if self.tile_rows is None:
+            # Measure all labels at once from their moments, contours are left until drawn
+            r = LabelStats(self._label(self.img_thresh))
+            self.sprayCard.stains = self._stain_table(r)
+            self.label_stats = None if self.stats_only else r
+        else:
+            self.sprayCard.stains = self._process_stains_tiled()
+        self.stain_index, self.stain_boundary = None, None
+
+    def _label(self, image_t, exclude_border=None, regions=None):
+        # regions, see segmentationOpenCV.label
         sc = self.sprayCard
-        image_t = self.img_thresh
+        if sc.segmentation_engine == cfg.SEGMENTATION_ENGINE_OPENCV:
+            return segmentationOpenCV.label(
+                image_t,
+                watershed=sc.watershed,
+                min_distance=self.min_distance,
+                exclude_border=exclude_border,
+                regions=regions,
+            )
+        return self._label_skimage(image_t, regions)
+
+    def _label_skimage(self, image_t, regions=None):
+        # Reference engine, never used for banded watershed
+        if self.sprayCard.watershed and regions is not None:
+            # Markers of equal height flood in an order set by the whole image,
+            # so regions are only segmented independently one at a time
+            labels = np.zeros(image_t.shape, dtype=np.int32)
+            for region in regions:
+                region_labels = self._label_skimage(
+                    np.ascontiguousarray(image_t[region])
+                )
+                labels[region] = np.where(
+                    region_labels > 0, region_labels + labels.max(), 0
+                )
+            return labels
         if self.sprayCard.watershed:
             # Generate markers as local maxima of distance to background
             distance = cv2.distanceTransform(
@@ -390,7 +875,7 @@ class SprayCardImageProcessor:
             )
             coords = peak_local_max(
                 distance,
-                min_distance=4,
+                min_distance=self.min_distance,
                 threshold_abs=0,
                 threshold_rel=0,
                 labels=image_t,
@@ -398,233 +883,373 @@ class SprayCardImageProcessor:
             mask = np.zeros(distance.shape, dtype=bool)
             mask[tuple(coords.T)] = True
             markers, _ = ndimage.label(mask)
-            labels = watershed(-distance, markers, mask=image_t, watershed_line=True)
-        else:
-            labels = sklabel(image_t)
-        # Iterate over each generated label
-        for r in regionprops(labels):
-            # Skip background
-            if r.label == 0:
-                continue
-            # Check for mimimum area
-            is_too_small = r.area < sc.min_stain_area_px
-            # Get bbox vals for offsetting local region
-            x1, y1, x2, y2 = r.bbox
-            # Check if touching edge
-            is_edge = (
-                True
-                if x1 <= 0
-                or y1 <= 0
-                or x2 >= image_t.shape[0] - 1
-                or y2 >= image_t.shape[1] - 1
-                else False
-            )
+            return watershed(-distance, markers, mask=image_t, watershed_line=True)
+        return sklabel(image_t)
+
+    def _stain_table(
+        self, r: LabelStats, row_offset: int = 0, col_offset: int = 0
+    ) -> StainTable:
+        # Stain table of labels measured row_offset rows down, col_offset columns
+        # across the card
+        sc = self.sprayCard
+        bbox = r.bbox + (row_offset, col_offset, row_offset, col_offset)
+        centroid = r.centroid + (row_offset, col_offset)
+        # Check for mimimum area
+        is_too_small = r.area < sc.min_stain_area_px * self.scale**2
+        # Check if touching edge
+        h, w = self.img_src.shape[:2]
+        is_edge = (
+            (bbox[:, 0] <= 0)
+            | (bbox[:, 1] <= 0)
+            | (bbox[:, 2] >= h - 1)
+            | (bbox[:, 3] >= w - 1)
+        )
+        # Store as columns for later use, centroid as cv2 (x, y)
+        return StainTable.build(
+            index=r.label,
+            area=self._approximate_stain_areas(r, centroid),
+            pixel_area=r.area,
+            is_too_small=is_too_small,
+            is_edge=is_edge,
             # Valid unless otherwise declared
-            is_include = not is_too_small and not is_edge
-            c, area = self._approximate_stain(r, image_t.shape)
-            # Convert to cv2 image array, applying offsets (-1 for padding above)
-            c_ = []
-            for pt in c:
-                c_.append([int(pt[1]), int(pt[0])])
-            c = np.array(c_).astype(int)
-
-            # Add it to the stains list for later use
-            sc.stains.append(
-                {
-                    "index": r.label,
-                    "contour": c,
-                    "area": area,
-                    "is_too_small": is_too_small,
-                    "is_edge": is_edge,
-                    "is_include": is_include,
-                }
+            is_include=~is_too_small & ~is_edge,
+            centroid=centroid[:, ::-1],
+        )
+
+    def _tile_rows(self, memory_mb: int = None) -> int:
+        # Rows per band to stay within the memory budget, None if the card fits
+        # whole. The source image is held throughout, the rest of the budget goes
+        # to the working arrays of a band
+        if memory_mb is None:
+            memory_mb = cfg.get_processing_memory_mb()
+        h, w = self.img_src.shape[:2]
+        budget_px = (
+            memory_mb * 2**20 - self.img_src.nbytes
+        ) // self._WORKING_BYTES_PER_PIXEL
+        if h * w <= budget_px:
+            return None
+        return max(1, budget_px // w)
+
+    def _image_threshold_tiled(self):
+        # Only the threshold is found up front, each band thresholds its own rows
+        # as it is segmented so no full card mask is held. A grayscale auto
+        # threshold still comes from the whole card's histogram
+        self.tile_hist = None
+        if self.sprayCard.threshold_type == cfg.THRESHOLD_TYPE_GRAYSCALE:
+            h = self.img_src.shape[0]
+            self.tile_hist = sum(
+                self.grayscale_histogram(
+                    cv2.cvtColor(
+                        self.img_src[a : a + self.tile_rows], cv2.COLOR_BGR2GRAY
+                    )
+                )
+                for a in range(0, h, self.tile_rows)
+            )
+        thresh_val, _ = self._image_threshold(self.img_src[:1], self.tile_hist)
+        return thresh_val, None
+
+    def _process_stains_tiled(self) -> StainTable:
+        # Segment bands of rows, each within a window reaching halo rows past it.
+        # Stains are measured in the window of the band holding the top row of
+        # their thresholded component, so every stain is measured whole and once
+        h = self.img_src.shape[0]
+        # Rows between a stain and the window edge needed for the same labels as
+        # whole card processing, watershed markers depend on their surroundings
+        margin = 2 * self.min_distance + 1 if self.sprayCard.watershed else 1
+        halo = max(margin, self.tile_rows // 8)
+        core = max(1, self.tile_rows - 2 * halo)
+        tables, first_pixels = [], []
+        for start in range(0, h, core):
+            table, first = self._process_band(start, min(h, start + core), halo, margin)
+            tables.append(table)
+            first_pixels.append(first)
+        # Back to raster order of each stain's first pixel
+        order = np.argsort(np.concatenate(first_pixels), kind="stable")
+        stains = StainTable.concatenate(tables).take(order)
+        stains.index = np.arange(1, len(stains) + 1, dtype=np.int32)
+        return stains
+
+    def _process_band(self, start: int, stop: int, halo: int, margin: int):
+        h, w = self.img_src.shape[:2]
+        while True:
+            top, bottom = max(0, start - halo), min(h, stop + halo)
+            _, window = self._image_threshold(self.img_src[top:bottom], self.tile_hist)
+            _, components, stats, _ = cv2.connectedComponentsWithStats(
+                window, connectivity=8, ltype=cv2.CV_32S
             )
+            comp_top = stats[:, cv2.CC_STAT_TOP] + top
+            comp_bottom = comp_top + stats[:, cv2.CC_STAT_HEIGHT]
+            owned = (comp_top >= start) & (comp_top < stop)
+            owned[0] = False
+            if bottom == h or not (owned & (comp_bottom > bottom - margin)).any():
+                break
+            # A stain of this band runs past the window, widen it and try again
+            halo *= 2
+        # Only the true card border keeps markers away from the window edges
+        md = self.min_distance
+        exclude_border = ((md if top == 0 else 0, md if bottom == h else 0), (md, md))
+        r = LabelStats(self._label(window, exclude_border))
+        first = r.first_pixels()
+        keep = owned[components.ravel()[first]]
+        return self._stain_table(r.take(keep), top), first[keep] + top * w
 
     def get_overlay_image(self):
-        sc = self.sprayCard
         img = self.img_src
-        cv2.drawContours(
-            img,
-            [stain["contour"] for stain in sc.stains if stain["is_include"]],
-            -1,
-            cfg.COLOR_STAIN_OUTLINE[::-1],
-            1,
-        )
+        # Outline valid stains where they meet anything else
+        img[
+            self._stain_boundary() & self._stain_mask(self._CLASS_VALID)
+        ] = cfg.COLOR_STAIN_OUTLINE[::-1]
         return img
 
     def get_mask_image(self):
-        sc = self.sprayCard
-        img = np.zeros((self.img_src.shape[0], self.img_src.shape[1], 3), np.uint8)
-        img[:] = (255, 255, 255)
-        cv2.drawContours(
-            img,
-            [stain["contour"] for stain in sc.stains if stain["is_too_small"]],
-            -1,
-            cfg.COLOR_STAIN_FILL_ALL[::-1],
-            -1,
-        )
-        cv2.drawContours(
-            img,
-            [stain["contour"] for stain in sc.stains if stain["is_edge"]],
-            -1,
-            cfg.COLOR_STAIN_FILL_EDGE[::-1],
-            -1,
+        # Each stain pixel colored by its stain's class, background white
+        colors = np.array(
+            [
+                (255, 255, 255),
+                cfg.COLOR_STAIN_FILL_ALL[::-1],
+                cfg.COLOR_STAIN_FILL_EDGE[::-1],
+                cfg.COLOR_STAIN_FILL_VALID[::-1],
+            ],
+            dtype=np.uint8,
         )
-        cv2.drawContours(
-            img,
-            [stain["contour"] for stain in sc.stains if stain["is_include"]],
-            -1,
-            cfg.COLOR_STAIN_FILL_VALID[::-1],
-            -1,
-        )
-        cv2.drawContours(
-            img,
-            [stain["contour"] for stain in sc.stains if stain["is_include"]],
-            -1,
-            (255, 255, 255),
-            1,
+        img = colors[self._stain_classes()][self._stain_index_image()]
+        # Separate touching valid stains
+        img[self._stain_boundary() & self._stain_mask(self._CLASS_VALID)] = (
+            255,
+            255,
+            255,
         )
         return img
 
-    def _image_threshold(self, img):
+    def _stain_classes(self) -> np.ndarray:
+        # Class of each stain table row, offset by one for background
+        stains = self.sprayCard.stains
+        classes = np.full(len(stains) + 1, self._CLASS_TOO_SMALL, dtype=np.uint8)
+        classes[0] = self._CLASS_BACKGROUND
+        classes[1:][stains.is_edge] = self._CLASS_EDGE
+        classes[1:][stains.is_include] = self._CLASS_VALID
+        return classes
+
+    def _stain_mask(self, stain_class: int) -> np.ndarray:
+        return (self._stain_classes() == stain_class)[self._stain_index_image()]
+
+    def _stain_index_image(self) -> np.ndarray:
+        # Stain table row + 1 of every pixel, 0 for background. Built once, redraws
+        # only index it with per stain lookup tables
+        if self.stain_index is not None:
+            return self.stain_index
+        r = self.label_stats
+        stains = self.sprayCard.stains
+        if self.sprayCard.stain_approximation_method in [
+            cfg.STAIN_APPROXIMATION_ELLIPSE,
+            cfg.STAIN_APPROXIMATION_MIN_CIRCLE,
+            cfg.STAIN_APPROXIMATION_CONVEX_HULL,
+        ]:
+            # Approximated stains are filled in from their contours, with
+            # valid stains over edge stains over the rest where they overlap
+            self._generate_contours()
+            self.stain_index = np.zeros(r.labels.shape, dtype=np.int32)
+            for mask in [stains.is_too_small, stains.is_edge, stains.is_include]:
+                for i in np.flatnonzero(mask):
+                    cv2.drawContours(
+                        self.stain_index, [stains.contour(i)], -1, int(i) + 1, -1
+                    )
+        else:
+            # Stains are the labels themselves, in label order
+            lut = np.zeros(r.labels.max() + 1, dtype=np.int32)
+            lut[r.label] = np.arange(1, len(r) + 1)
+            self.stain_index = lut[r.labels]
+        return self.stain_index
+
+    def _stain_boundary(self) -> np.ndarray:
+        # Stain pixels with a 4-connected neighbor of another stain or background
+        if self.stain_boundary is None:
+            index = self._stain_index_image().astype(np.float32)
+            kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+            self.stain_boundary = (index > 0) & (
+                cv2.dilate(index, kernel) != cv2.erode(index, kernel)
+            )
+        return self.stain_boundary
+
+    def _image_threshold(self, img, hist=None):
         if self.sprayCard.threshold_type == cfg.THRESHOLD_TYPE_GRAYSCALE:
-            return self._image_threshold_grayscale(img)
+            return self._image_threshold_grayscale(img, hist)
         else:
             return self._image_threshold_color(img)
 
-    def _image_threshold_grayscale(self, img):
-        # Convert to grayscale
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    def _image_threshold_grayscale(self, img, hist=None):
+        # Grayscale image and histogram are cached per card, except for downsampled
+        # previews and banded processing
+        if self.cached and self.scale == 1.0 and self.tile_rows is None:
+            img_gray = self.sprayCard.image_grayscale()
+            hist = self.sprayCard.grayscale_histogram()
+        else:
+            img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if hist is None:
+                hist = self.grayscale_histogram(img_gray)
+        thresh_val = self.sprayCard.threshold_grayscale
         if (
             self.sprayCard.threshold_method_grayscale
             == cfg.THRESHOLD_GRAYSCALE_METHOD_AUTO
         ):
-            # Run Otsu Threshold, if threshold value is within ui-specified range, return it
-            thresh_val, _img_thresh = cv2.threshold(
-                src=img_gray,
-                thresh=0,  # This val isn't used when Otsu's method is employed
-                maxval=255,
-                type=cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU,
-            )
-            if thresh_val <= self.sprayCard.threshold_grayscale:
-                return thresh_val, _img_thresh
-        # If manually thresholding, or auto returned threshold value outside ui-specified range, run manual thresh and return it
+            # Otsu threshold from histogram, if within ui-specified range use it
+            otsu_val = self.otsu_threshold(hist)
+            if otsu_val <= thresh_val:
+                thresh_val = otsu_val
+        # Stains are pixels at or below the threshold
         _, img_thresh = cv2.threshold(
             src=img_gray,
-            thresh=self.sprayCard.threshold_grayscale,
+            thresh=thresh_val,
             maxval=255,
             type=cv2.THRESH_BINARY_INV,
         )
-        return self.sprayCard.threshold_grayscale, img_thresh
+        return thresh_val, img_thresh
+
+    @staticmethod
+    def grayscale_histogram(img_gray) -> np.ndarray:
+        return np.bincount(img_gray.ravel(), minlength=256).astype(np.float64)
+
+    @staticmethod
+    def otsu_threshold(hist: np.ndarray) -> int:
+        # Otsu's method on a 256-bin histogram, matches cv2.THRESH_OTSU
+        levels = np.arange(256, dtype=np.float64)
+        p = hist / hist.sum()
+        q1 = np.cumsum(p)
+        q2 = 1.0 - q1
+        m1 = np.cumsum(levels * p)
+        mu = m1[-1]
+        eps = np.finfo(np.float32).eps
+        valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1.0 - eps)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu1 = m1 / q1
+            mu2 = (mu - m1) / q2
+            sigma = q1 * q2 * (mu1 - mu2) ** 2
+        sigma = np.where(valid, sigma, -1.0)
+        return int(np.argmax(sigma)) if sigma.max() > 0 else 0
+
+    @staticmethod
+    def threshold_coverage(hist: np.ndarray) -> np.ndarray:
+        return np.cumsum(hist) / hist.sum() * 100.0
 
     def _image_threshold_color(self, img):
-        # Readability
-        hbl = 0
-        hvl = self.sprayCard.threshold_color_hue_min
-        hvh = self.sprayCard.threshold_color_hue_max
-        hbh = 179
-        sbl = 0
-        svl = self.sprayCard.threshold_color_saturation_min
-        svh = self.sprayCard.threshold_color_saturation_max
-        sbh = 255
-        bbl = 0
-        bvl = self.sprayCard.threshold_color_brightness_min
-        bvh = self.sprayCard.threshold_color_brightness_max
-        bbh = 255
-        # Use HSV colorspace
-        img_hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        # Check Hue channel
-        if self.sprayCard.threshold_color_hue_pass:
-            # Band-Pass
-            mask_hue = cv2.inRange(
-                img_hsv, np.array([hvl, sbl, bbl]), np.array([hvh, sbh, bbh])
-            )
-        else:
-            # Band-Reject
-            mask_hue_low = cv2.inRange(
-                img_hsv, np.array([hbl, sbl, bbl]), np.array([hvl, sbh, bbh])
-            )
-            mask_hue_high = cv2.inRange(
-                img_hsv, np.array([hvh, sbl, bbl]), np.array([hbh, sbh, bbh])
-            )
-            mask_hue = cv2.bitwise_or(mask_hue_low, mask_hue_high)
-        # Check Saturation channel
-        if self.sprayCard.threshold_color_saturation_pass:
-            # Band-Pass
-            mask_sat = cv2.inRange(
-                img_hsv, np.array([hbl, svl, bbl]), np.array([hbh, svh, bbh])
-            )
+        sc = self.sprayCard
+        # HSV image is cached per card, except for downsampled previews and banded
+        # processing
+        if self.cached and self.scale == 1.0 and self.tile_rows is None:
+            img_hsv = sc.image_hsv()
         else:
-            # Band-Reject
-            mask_sat_low = cv2.inRange(
-                img_hsv, np.array([hbl, sbl, bbl]), np.array([hbh, svl, bbh])
-            )
-            mask_sat_high = cv2.inRange(
-                img_hsv, np.array([hbl, svh, bbl]), np.array([hbh, sbh, bbh])
-            )
-            mask_sat = cv2.bitwise_or(mask_sat_low, mask_sat_high)
-        # Check Brightness channel
-        if self.sprayCard.threshold_color_brightness_pass:
-            # Band-Pass
-            mask_bri = cv2.inRange(
-                img_hsv, np.array([hbl, sbl, bvl]), np.array([hbh, sbh, bvh])
-            )
+            img_hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        # Compile each channel's band-pass/reject into a lookup table (255 = pass)
+        lut = np.dstack(
+            [
+                self._channel_lut(
+                    sc.threshold_color_hue_min,
+                    sc.threshold_color_hue_max,
+                    sc.threshold_color_hue_pass,
+                    179,
+                ),
+                self._channel_lut(
+                    sc.threshold_color_saturation_min,
+                    sc.threshold_color_saturation_max,
+                    sc.threshold_color_saturation_pass,
+                    255,
+                ),
+                self._channel_lut(
+                    sc.threshold_color_brightness_min,
+                    sc.threshold_color_brightness_max,
+                    sc.threshold_color_brightness_pass,
+                    255,
+                ),
+            ]
+        )
+        # Keep pixels passing on all three channels
+        img_pass = cv2.LUT(img_hsv, lut)
+        return 0, cv2.inRange(img_pass, (255, 255, 255), (255, 255, 255))
+
+    @staticmethod
+    def _channel_lut(low, high, band_pass, channel_max) -> np.ndarray:
+        # Inclusive bounds, as with cv2.inRange
+        v = np.arange(256)
+        if band_pass:
+            passes = (v >= low) & (v <= high)
         else:
-            # Band-Reject
-            mask_bri_low = cv2.inRange(
-                img_hsv, np.array([hbl, sbl, bbl]), np.array([hbh, sbh, bvl])
-            )
-            mask_bri_high = cv2.inRange(
-                img_hsv, np.array([hbl, sbl, bvh]), np.array([hbh, sbh, bbh])
-            )
-            mask_bri = cv2.bitwise_or(mask_bri_low, mask_bri_high)
-        # Merge layers and return
-        return 0, cv2.bitwise_and(cv2.bitwise_and(mask_hue, mask_sat), mask_bri)
-
-    def _approximate_stain(self, regionprop, image_shape):
-        x, y = regionprop.centroid
-        x = int(x)
-        y = int(y)
+            passes = ((v <= low) | (v >= high)) & (v <= channel_max)
+        return np.where(passes, 255, 0).astype(np.uint8)
+
+    def _approximate_stain_areas(self, r: LabelStats, centroid) -> np.ndarray:
+        method = self.sprayCard.stain_approximation_method
+        if method == cfg.STAIN_APPROXIMATION_CONVEX_HULL:
+            return r.area_convex()
+        if method not in [
+            cfg.STAIN_APPROXIMATION_ELLIPSE,
+            cfg.STAIN_APPROXIMATION_MIN_CIRCLE,
+        ]:
+            return r.area.astype(np.float64)
+        r_radius, c_radius = self._ellipse_radii(r)
+        # Stains without a drawable ellipse keep their pixel area
+        x, y = np.trunc(centroid).T
+        drawable = (x >= 1) & (y >= 1) & (r_radius >= 1) & (c_radius >= 1)
+        return np.where(drawable, np.pi * r_radius * c_radius, r.area)
+
+    def _ellipse_radii(self, r: LabelStats) -> tuple[np.ndarray, np.ndarray]:
+        r_radius = np.trunc(r.axis_minor_length / 2)
+        c_radius = np.trunc(r.axis_major_length / 2)
+        if (
+            self.sprayCard.stain_approximation_method
+            == cfg.STAIN_APPROXIMATION_MIN_CIRCLE
+        ):
+            r_radius = c_radius = np.maximum(r_radius, c_radius)
+        return r_radius, c_radius
+
+    def _generate_contours(self):
+        # Contours are only needed for drawing, build them on first draw
+        stains = self.sprayCard.stains
+        if stains.has_contours:
+            return
+        r = self.label_stats
         method = self.sprayCard.stain_approximation_method
         if method in [
             cfg.STAIN_APPROXIMATION_ELLIPSE,
             cfg.STAIN_APPROXIMATION_MIN_CIRCLE,
         ]:
-            r_radius = int(regionprop.minor_axis_length / 2)
-            c_radius = int(regionprop.major_axis_length / 2)
-            if method == cfg.STAIN_APPROXIMATION_MIN_CIRCLE:
-                radius_max = max(r_radius, c_radius)
-                r_radius = radius_max
-                c_radius = radius_max
-            angle = (
-                2 * np.pi
-            ) - regionprop.orientation  # To account for regionprops(ccw) to ellipse_perimeter(cw)
-            if x < 1 or y < 1 or r_radius < 1 or c_radius < 1:
-                return self._get_raw_stain(regionprop)
-            rr, cc = ellipse_perimeter(
-                x, y, c_radius, r_radius, shape=image_shape, orientation=angle
-            )
-            sorted_by_angle_to_centroid = np.argsort(
-                np.arctan2(rr - np.mean(rr), cc - np.mean(cc))
-            )
-            rr = rr[sorted_by_angle_to_centroid]
-            cc = cc[sorted_by_angle_to_centroid]
-            return np.array((rr, cc)).T, np.pi * r_radius * c_radius
+            r_radius, c_radius = self._ellipse_radii(r)
+            # To account for regionprops(ccw) to ellipse_perimeter(cw)
+            angle = (2 * np.pi) - r.orientation
+            contours = [
+                self._approximate_stain(
+                    r, i, int(r_radius[i]), int(c_radius[i]), angle[i]
+                )
+                for i in range(len(r))
+            ]
         else:
             # No approximation or convex hull
-            return self._get_raw_stain(regionprop)
+            contours = [self._get_raw_stain(r, i) for i in range(len(r))]
+        # Convert (row, col) to cv2 (x, y) contour points
+        stains.set_contours([c[:, ::-1].astype(np.int32) for c in contours])
+
+    def _approximate_stain(self, r: LabelStats, i, r_radius, c_radius, angle):
+        x, y = r.centroid[i].astype(int)
+        if x < 1 or y < 1 or r_radius < 1 or c_radius < 1:
+            return self._get_raw_stain(r, i)
+        rr, cc = ellipse_perimeter(
+            x, y, c_radius, r_radius, shape=r.labels.shape, orientation=angle
+        )
+        sorted_by_angle_to_centroid = np.argsort(
+            np.arctan2(rr - np.mean(rr), cc - np.mean(cc))
+        )
+        rr = rr[sorted_by_angle_to_centroid]
+        cc = cc[sorted_by_angle_to_centroid]
+        return np.array((rr, cc)).T
 
-    def _get_raw_stain(self, regionprop):
-        x1, y1, x2, y2 = regionprop.bbox
+    def _get_raw_stain(self, r: LabelStats, i):
+        x1, y1, _, _ = r.bbox[i]
         if (
             self.sprayCard.stain_approximation_method
             == cfg.STAIN_APPROXIMATION_CONVEX_HULL
         ):
-            image = regionprop.image_convex
-            area = regionprop.area_convex
+            image = r.image_convex(i)
         else:
-            image = regionprop.image
-            area = regionprop.area
+            image = r.image(i)
         # Take local region (bbox) binary image and get the contour of current label
         img_binary_padded = np.pad(image, 1, mode="constant", constant_values=False)
         c = find_contours(
@@ -632,4 +1257,122 @@ class SprayCardImageProcessor:
         )[0]
         c[:, 0] += x1 - 1
         c[:, 1] += y1 - 1
-        return c, area
+        return c
+
+
+class SprayCardSheetProcessor:
+    """
+    Processes the cards of a scanned sheet straight from the decoded sheet, as
+    they are loaded. Each card's region is thresholded with its own options, then
+    regions are labeled and measured together, in as few passes as the
+    processing memory budget allows, and stains go to the card whose region holds
+    their bounding box. Results match processing each card from its stored image.
+    Cards touching another, off the sheet or too large for the budget are left
+    for regular processing
+    """
+
+    def __init__(
+        self,
+        image: np.ndarray,
+        rects: list[tuple[int, int, int, int]],
+        cards: list[SprayCard],
+        memory_mb: int = None,
+    ):
+        # Card (x, y, w, h) regions of the image, with the card each is processed as
+        self.image = image
+        self.rects = rects
+        self.cards = cards
+        if memory_mb is None:
+            memory_mb = cfg.get_processing_memory_mb()
+        self.budget_px = (
+            memory_mb * 2**20 // SprayCardImageProcessor._WORKING_BYTES_PER_PIXEL
+        )
+
+    def process(self) -> list[SprayCard]:
+        """
+        Processed detached copies of cards, None for those left to regular
+        processing. Apply with SprayCard.apply_processing_results
+        """
+        processed = [None] * len(self.rects)
+        for group in self._groups():
+            for i, card in zip(group, self._process_group(group)):
+                processed[i] = card
+        return processed
+
+    def _groups(self) -> list[list[int]]:
+        # Cards sharing a labeling pass, in runs down the sheet within budget
+        h, w = self.image.shape[:2]
+        eligible = [
+            i
+            for i, (x, y, rw, rh) in enumerate(self.rects)
+            if x >= 0
+            and y >= 0
+            and x + rw <= w
+            and y + rh <= h
+            and rw * rh <= self.budget_px
+            and not self._touches_other(i)
+        ]
+        eligible.sort(key=lambda i: (self._labeling_params(i), self.rects[i][1]))
+        groups = []
+        for i in eligible:
+            group = groups[-1] if groups else []
+            if group and self._labeling_params(group[0]) == self._labeling_params(i):
+                top, left, bottom, right = self._bounds(group + [i])
+                if (bottom - top) * (right - left) <= self.budget_px:
+                    group.append(i)
+                    continue
+            groups.append([i])
+        return groups
+
+    def _labeling_params(self, i: int) -> tuple:
+        card = self.cards[i]
+        return (card.segmentation_engine, card.watershed)
+
+    def _touches_other(self, i: int) -> bool:
+        # Regions must be a background pixel apart to label independently
+        x, y, w, h = self.rects[i]
+        for j, (x2, y2, w2, h2) in enumerate(self.rects):
+            if j != i and x <= x2 + w2 and x2 <= x + w and y <= y2 + h2 and y2 <= y + h:
+                return True
+        return False
+
+    def _bounds(self, group: list[int]) -> tuple[int, int, int, int]:
+        rects = np.array([self.rects[i] for i in group])
+        return (
+            rects[:, 1].min(),
+            rects[:, 0].min(),
+            (rects[:, 1] + rects[:, 3]).max(),
+            (rects[:, 0] + rects[:, 2]).max(),
+        )
+
+    def _process_group(self, group: list[int]) -> list[SprayCard]:
+        top, left, bottom, right = self._bounds(group)
+        img_thresh = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        cards, scips, regions = [], [], []
+        for i in group:
+            x, y, w, h = self.rects[i]
+            # Detached copy, as sent to a worker process
+            card = copy.copy(self.cards[i])
+            card.stats = SprayCardStats(sprayCard=card)
+            scip = SprayCardImageProcessor(
+                sprayCard=card, img_src=self.image[y : y + h, x : x + w]
+            )
+            card.threshold_grayscale_calculated = scip.threshold_grayscale_calculated
+            region = (slice(y - top, y - top + h), slice(x - left, x - left + w))
+            img_thresh[region] = scip.img_thresh
+            cards.append(card)
+            scips.append(scip)
+            regions.append(region)
+        # One labeling and measurement for all regions
+        r = LabelStats(scips[0]._label(img_thresh, regions=regions))
+        for card, scip, (rows, cols) in zip(cards, scips, regions):
+            in_region = (
+                (r.bbox[:, 0] >= rows.start)
+                & (r.bbox[:, 2] <= rows.stop)
+                & (r.bbox[:, 1] >= cols.start)
+                & (r.bbox[:, 3] <= cols.stop)
+            )
+            card.stains = scip._stain_table(r.take(in_region), -rows.start, -cols.start)
+            card.stains_segmentation_params = card.segmentation_params()
+            card.current = True
+        return cards
@@ -1,8 +1,9 @@
 import matplotlib.ticker
 import numpy as np
+from accupatt.models.dropletSketch import DropletSketch
 from accupatt.models.passData import Pass
 from accupatt.models.seriesData import SeriesData
-from accupatt.models.sprayCard import SprayCard
+from accupatt.models.sprayCard import SprayCard, SprayCardStats
 from accupatt.widgets.mplwidget import MplWidget
 
 from PyQt6.QtWidgets import QTableWidget
@@ -11,9 +12,9 @@ from PyQt6.QtWidgets import QTableWidget
 class SprayCardComposite(SprayCard):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Must keep these lists for appending to as building from individual spray cards
-        self.drop_dia_um = []
-        self.drop_vol_um3 = []
+        # Merged droplet sketches of all cards in the composite
+        self.sketch = DropletSketch()
+        self.stats = SprayCardCompositeStats(sprayCard=self)
         # Must keep this for building sum area of individual spray cards
         self.area_in2 = 0.0
 
@@ -36,24 +37,22 @@ class SprayCardComposite(SprayCard):
         self._buildFromList(cards)
 
     def _buildFromList(self, cards: list[SprayCard]):
-        # Build composite from valid cards
+        # Merge the sketches of valid cards, individual stains are not needed
+        sketches = [self.sketch]
         for card in cards:
             if not card.has_image:
                 continue
             if not card.include_in_composite:
                 continue
-            self.area_px2 += card.area_px2
-            self.area_in2 += card.stats._px2_to_in2(card.area_px2)
-            dd, dv = card.stats.get_droplet_diameters_and_volumes()
-            self.drop_dia_um.extend(dd)
-            self.drop_vol_um3.extend(dv)
-            self.stains.extend(card.stains)
-        # Sort the dia and vol lists before computing dv's
-        self.stains.sort(key=lambda s: s["area"])
-        self.drop_dia_um.sort()
-        self.drop_vol_um3.sort()
+            sketches.append(card.stats.get_droplet_sketch())
+        self.buildFromSketch(DropletSketch.merge(sketches))
+
+    def buildFromSketch(self, sketch: DropletSketch):
+        self.sketch = sketch
+        self.area_px2 = self.sketch.area_px2
+        self.area_in2 = self.sketch.area_in2
         # Set the dv vals in composite stats object for future use
-        self.stats.set_volumetric_stats(self.drop_dia_um, self.drop_vol_um3)
+        self.stats.set_volumetric_stats()
 
     """
     Plot Methods
@@ -67,20 +66,7 @@ class SprayCardComposite(SprayCard):
     ):
         # Create sorting bins
         bins = [x for x in range(0, 900, 50)]
-        binned_cov = [0 for b in bins]
-        binned_quant = [0 for b in bins]
-        # Abort if no stains
-        if any([s["is_include"] for s in self.stains]):
-            # Convenience accessors
-            area_list = [s["area"] for s in self.stains if s["is_include"]]
-            sum_area = sum(area_list)
-            dia_list = self.drop_dia_um
-            # Get an array of bins each drop dia belongs in (1-based)
-            binned_dia = np.digitize(dia_list, bins)
-            # Sort values into bins
-            for area, bin in zip(area_list, binned_dia):
-                binned_cov[bin - 1] += area / sum_area
-                binned_quant[bin - 1] += 1
+        binned_cov, binned_quant = self.sketch.histogram(bins)
         self._plotDistCov(mplWidget1, bins, binned_cov)
         self._plotDistQuant(mplWidget2, bins, binned_quant)
         self._plotDistStatTable(tableWidget)
@@ -121,12 +107,16 @@ class SprayCardComposite(SprayCard):
         for row in range(tableWidget.rowCount()):
             tableWidget.item(row, 1).setText("-")
         # If no drops, return
-        if not any(s["is_include"] for s in self.stains):
+        if self.stats.get_number_of_stains() == 0:
             return
         tableWidget.item(0, 1).setText(self.stats.get_dsc())
         tableWidget.item(1, 1).setText(self.stats.get_dv01(text=True))
         tableWidget.item(2, 1).setText(self.stats.get_dv05(text=True))
         tableWidget.item(3, 1).setText(self.stats.get_dv09(text=True))
+        for row, name in [(1, "dv01"), (2, "dv05"), (3, "dv09")]:
+            tableWidget.item(row, 1).setToolTip(
+                self.stats.get_confidence_interval(name, text=True)
+            )
         tableWidget.item(4, 1).setText(self.stats.get_relative_span(text=True))
         tableWidget.item(5, 1).setText(self.stats.get_percent_coverage(text=True))
         tableWidget.item(6, 1).setText(f"{self.area_in2:.2f} in\u00B2")
@@ -135,3 +125,36 @@ class SprayCardComposite(SprayCard):
             str(round(self.stats.get_number_of_stains() / self.area_in2))
         )
         tableWidget.resizeColumnsToContents()
+
+
+class SprayCardCompositeStats(SprayCardStats):
+    """
+    Stats of a composite card, all taken from its merged droplet sketch
+    """
+
+    def set_volumetric_stats(self, bootstrap_resamples: int = None):
+        self.clear_snapshot()
+        sketch: DropletSketch = self.sprayCard.sketch
+        if sketch.number_of_droplets() == 0:
+            self._clear_volumetric_stats()
+            return
+        dv01, dv05, dv09 = sketch.dv([0.10, 0.50, 0.90])
+        self._set_volumetric_stats(dv01, dv05, dv09, sketch.volume_sum_um3())
+        self._set_confidence_intervals(sketch, bootstrap_resamples)
+
+    def get_percent_coverage(self, text=False):
+        sketch: DropletSketch = self.sprayCard.sketch
+        if sketch.area_px2 == 0:
+            return 0
+        cov = (sketch.coverage_px2 / sketch.area_px2) * 100.0
+        if text:
+            return f"{cov:.2f}%"
+        else:
+            return cov
+
+    def get_number_of_stains(self, text=False):
+        l = self.sprayCard.sketch.number_of_droplets()
+        if text:
+            return str(l)
+        else:
+            return l
@@ -0,0 +1,184 @@
+import io
+
+import numpy as np
+
+
+class StainTable:
+    """
+    Columnar store of the stains detected on a spray card. Per-stain values are held
+    in parallel numpy arrays so counts, sums and include/edge filters are simple
+    vectorized masks. Contours (x, y pixel coords for cv2) are only generated when a
+    card is drawn, see set_contours, and are kept in one ragged buffer, with contour i
+    spanning contour_points[contour_offsets[i]:contour_offsets[i+1]]
+    """
+
+    _COLUMNS = (
+        "index",
+        "area",
+        "pixel_area",
+        "is_too_small",
+        "is_edge",
+        "is_include",
+        "centroid",
+    )
+    _CONTOUR_COLUMNS = ("contour_points", "contour_offsets")
+
+    def __init__(
+        self,
+        index=None,
+        area=None,
+        pixel_area=None,
+        is_too_small=None,
+        is_edge=None,
+        is_include=None,
+        centroid=None,
+        contour_points=None,
+        contour_offsets=None,
+    ):
+        self.index = self._column(index, np.int32)
+        self.area = self._column(area, np.float64)
+        # Labeled region pixel count, prior to any approximation
+        self.pixel_area = self._column(pixel_area, np.int64)
+        self.is_too_small = self._column(is_too_small, bool)
+        self.is_edge = self._column(is_edge, bool)
+        self.is_include = self._column(is_include, bool)
+        # Centroid as (x, y) to match contour point ordering
+        self.centroid = (
+            np.zeros((0, 2), dtype=np.float64)
+            if centroid is None
+            else np.asarray(centroid, dtype=np.float64).reshape(-1, 2)
+        )
+        # None until contours are generated
+        self.contour_points = None
+        self.contour_offsets = None
+        if contour_offsets is not None:
+            self.contour_points = np.asarray(contour_points, dtype=np.int32).reshape(
+                -1, 2
+            )
+            self.contour_offsets = np.asarray(contour_offsets, dtype=np.int64)
+
+    @classmethod
+    def build(
+        cls,
+        index,
+        area,
+        pixel_area,
+        is_too_small,
+        is_edge,
+        is_include,
+        centroid,
+        contours: list[np.ndarray] = None,
+    ) -> "StainTable":
+        table = cls(
+            index=index,
+            area=area,
+            pixel_area=pixel_area,
+            is_too_small=is_too_small,
+            is_edge=is_edge,
+            is_include=is_include,
+            centroid=centroid,
+        )
+        if contours is not None:
+            table.set_contours(contours)
+        return table
+
+    @classmethod
+    def concatenate(cls, tables: list["StainTable"]) -> "StainTable":
+        tables = [t for t in tables if len(t) > 0]
+        if not tables:
+            return cls()
+        points, offsets = None, None
+        if all(t.has_contours for t in tables):
+            # Shift each table's contour offsets past the points of the tables before it
+            offsets = [np.zeros(1, dtype=np.int64)]
+            base = 0
+            for t in tables:
+                offsets.append(t.contour_offsets[1:] + base)
+                base += len(t.contour_points)
+            points = np.concatenate([t.contour_points for t in tables])
+            offsets = np.concatenate(offsets)
+        return cls(
+            index=np.concatenate([t.index for t in tables]),
+            area=np.concatenate([t.area for t in tables]),
+            pixel_area=np.concatenate([t.pixel_area for t in tables]),
+            is_too_small=np.concatenate([t.is_too_small for t in tables]),
+            is_edge=np.concatenate([t.is_edge for t in tables]),
+            is_include=np.concatenate([t.is_include for t in tables]),
+            centroid=np.concatenate([t.centroid for t in tables]),
+            contour_points=points,
+            contour_offsets=offsets,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "StainTable":
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            return cls(
+                **{
+                    name: npz[name]
+                    for name in cls._COLUMNS + cls._CONTOUR_COLUMNS
+                    if name in npz
+                }
+            )
+
+    def to_bytes(self) -> bytes:
+        # Uncompressed npz, restoring must be cheaper than reprocessing. Contours
+        # are left out, they are regenerated whenever the card is drawn
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: getattr(self, name) for name in self._COLUMNS})
+        return buffer.getvalue()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def has_contours(self) -> bool:
+        return self.contour_offsets is not None
+
+    def set_contours(self, contours: list[np.ndarray]):
+        # Pack a list of per-stain contours into the ragged buffer
+        lengths = np.array([len(c) for c in contours], dtype=np.int64)
+        self.contour_offsets = np.zeros(len(contours) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.contour_offsets[1:])
+        self.contour_points = (
+            np.concatenate(contours).astype(np.int32, copy=False)
+            if contours
+            else np.zeros((0, 2), dtype=np.int32)
+        )
+
+    def contour(self, i: int) -> np.ndarray:
+        return self.contour_points[
+            self.contour_offsets[i] : self.contour_offsets[i + 1]
+        ]
+
+    def contours(self, mask=None) -> list[np.ndarray]:
+        # Views into the contour buffer, suitable for cv2.drawContours
+        indices = range(len(self)) if mask is None else np.flatnonzero(mask)
+        return [self.contour(i) for i in indices]
+
+    def take(self, indices) -> "StainTable":
+        indices = np.asarray(indices, dtype=np.int64)
+        return StainTable.build(
+            index=self.index[indices],
+            area=self.area[indices],
+            pixel_area=self.pixel_area[indices],
+            is_too_small=self.is_too_small[indices],
+            is_edge=self.is_edge[indices],
+            is_include=self.is_include[indices],
+            centroid=self.centroid[indices],
+            contours=(
+                [self.contour(i) for i in indices] if self.has_contours else None
+            ),
+        )
+
+    def classify(self, min_stain_area_px: int):
+        # Re-apply the minimum area filter, edge flags are fixed by segmentation
+        self.is_too_small = self.pixel_area < min_stain_area_px
+        self.is_include = ~self.is_too_small & ~self.is_edge
+
+    def sorted_by_area(self) -> "StainTable":
+        return self.take(np.argsort(self.area, kind="stable"))
+
+    def _column(self, values, dtype) -> np.ndarray:
+        if values is None:
+            return np.zeros(0, dtype=dtype)
+        return np.asarray(values, dtype=dtype).ravel()
@@ -17,6 +17,9 @@ class SingleCardWidget(QWidget):
         self.graphicsView1.setScene(scene1)
 
         self.fit = Qt.AspectRatioMode.KeepAspectRatioByExpanding
+        # Card shown from its stored levels, see updateSprayCardImage
+        self.sprayCard = None
+        self.scale = 1.0
 
         # Signals for syncing scrollbars
         self.graphicsView1.verticalScrollBar().valueChanged[int].connect(
@@ -39,21 +42,52 @@ class SingleCardWidget(QWidget):
     def updateSprayCardView(self, cvImg1=None):
         self.clearSprayCardView()
         if not cvImg1 is None:
-            self.pixmap_item_original.setPixmap(
-                QPixmap.fromImage(SingleCardWidget.qImg_from_cvImg(cvImg1))
-            )
+            self._set_image(cvImg1, 1.0)
         # Auto-resize to fit width of card to width of graphicsView
         scene1 = self.graphicsView1.scene()
         scene1.setSceneRect(scene1.itemsBoundingRect())
         self.resize_and_fit()
 
+    def updateSprayCardImage(self, sprayCard):
+        # Show the card's image from the smallest stored level covering the view,
+        # moving to larger levels (or full resolution) only as the view needs them
+        self.clearSprayCardView()
+        self.sprayCard = sprayCard
+        cvImg1, scale = sprayCard.image_thumbnail(0)
+        if cvImg1 is not None:
+            self._set_image(cvImg1, scale)
+        self.resize_and_fit()
+
     def clearSprayCardView(self):
+        self.sprayCard = None
+        self.scale = 1.0
         self.pixmap_item_original.setPixmap(QPixmap())
 
     def resize_and_fit(self):
         scene1 = self.graphicsView1.scene()
         scene1.setSceneRect(scene1.itemsBoundingRect())
         self.graphicsView1.fitInView(scene1.sceneRect(), self.fit)
+        if self.sprayCard is not None and self.scale < 1.0:
+            # Longest side of the card as drawn, in device pixels
+            rect = scene1.sceneRect()
+            size = (
+                max(rect.width(), rect.height())
+                * self.graphicsView1.transform().m11()
+                * self.graphicsView1.devicePixelRatioF()
+            )
+            cvImg1, scale = self.sprayCard.image_thumbnail(size)
+            if scale > self.scale:
+                self._set_image(cvImg1, scale)
+                scene1.setSceneRect(scene1.itemsBoundingRect())
+                self.graphicsView1.fitInView(scene1.sceneRect(), self.fit)
+
+    def _set_image(self, cvImg, scale: float):
+        # Levels are drawn scaled up, so the scene is always in full resolution pixels
+        self.scale = scale
+        self.pixmap_item_original.setPixmap(
+            QPixmap.fromImage(SingleCardWidget.qImg_from_cvImg(cvImg))
+        )
+        self.pixmap_item_original.setScale(1 / scale)
 
     def qImg_from_cvImg(cvImg):
         height, width = cvImg.shape[:2]
@@ -4,6 +4,7 @@ import os
 import accupatt.config as cfg
 from PyQt6.QtCore import QSortFilterProxyModel, Qt, QTimer, pyqtSlot, QSignalBlocker
 from PyQt6.QtWidgets import (
+    QApplication,
     QComboBox,
     QHeaderView,
     QMessageBox,
@@ -13,11 +14,12 @@ from PyQt6.QtWidgets import (
 )
 from pyqtgraph import PlotWidget
 from accupatt.helpers.cardStatTabelModel import CardStatTableModel, ComboBoxDelegate
+from accupatt.helpers.sprayCardProcessPool import SprayCardProcessPool
 
+from accupatt.models.compositeIndex import CompositeIndex
 from accupatt.models.passData import Pass
 from accupatt.models.seriesData import SeriesData
 from accupatt.models.sprayCard import SprayCard
-from accupatt.models.sprayCardComposite import SprayCardComposite
 from accupatt.widgets.mplwidget import MplWidget
 from accupatt.widgets.tabWidgetBase import TabWidgetBase
 from accupatt.windows.cardManager import CardManager
@@ -71,15 +73,46 @@ class TabWidgetCards(TabWidgetBase):
         prog.setMinimumDuration(0)
         prog.setWindowModality(Qt.WindowModality.WindowModal)
         prog.setRange(0, len(card_list))
-        for i, card in enumerate(card_list):
-            prog.setValue(i)
-            prog.setLabelText(
-                f"Processing {card_identifier_list[i]} and caching droplet statistics"
-            )
-            card.process_image()
-            card.stats.set_volumetric_stats()
-            if prog.wasCanceled():
-                return
+        # Cards whose segmentation options are unchanged only need re-filtering and stats
+        segment_indices = [i for i, c in enumerate(card_list) if c.needs_segmentation()]
+        if cfg.get_card_process_workers() > 1 and len(segment_indices) > 1:
+            for card in card_list:
+                if not card.needs_segmentation():
+                    card.update_stains()
+                    card.stats.set_volumetric_stats()
+            # Process remaining cards concurrently, reporting each as it completes
+            num_complete = len(card_list) - len(segment_indices)
+            prog.setValue(num_complete)
+            prog.setLabelText(f"Processing {len(segment_indices)} cards in parallel")
+            pool = SprayCardProcessPool()
+            for i in pool.process([card_list[i] for i in segment_indices]):
+                if prog.wasCanceled():
+                    pool.cancel()
+                    return
+                if i is None:
+                    QApplication.processEvents()
+                    continue
+                num_complete += 1
+                prog.setValue(num_complete)
+                prog.setLabelText(
+                    f"Processed {card_identifier_list[segment_indices[i]]} and cached droplet statistics"
+                )
+            if pool.failed:
+                QMessageBox.warning(
+                    self,
+                    "Processing Failed",
+                    f"The following cards could not be processed and are left unprocessed: [{', '.join(f'{card_identifier_list[segment_indices[i]]} ({e})' for i, e in pool.failed.items())}]",
+                )
+        else:
+            for i, card in enumerate(card_list):
+                prog.setValue(i)
+                prog.setLabelText(
+                    f"Processing {card_identifier_list[i]} and caching droplet statistics"
+                )
+                card.update_stains()
+                card.stats.set_volumetric_stats()
+                if prog.wasCanceled():
+                    return
         prog.setValue(len(card_list))
         # Notify of cards which exceeded max stain limit
         if any([c.flag_max_stain_limit_reached for c in card_list]):
@@ -230,10 +263,12 @@ class TabWidgetCards(TabWidgetBase):
         self.seriesData.cards.plotCVTable(self.tableWidgetCV)
 
     def distributions_triggered(self):
-        composite = SprayCardComposite()
+        index = CompositeIndex(
+            self.seriesData.passes, loc_units=self.seriesData.info.swath_units
+        )
         if self.comboBoxDistPass.currentIndex() == 0:
             # "All (Series-Wise Composite)" option
-            composite.buildFromSeries(seriesData=self.seriesData)
+            composite = index.series_composite()
         else:
             distPassData = self.getActiveCardPasses()[
                 self.comboBoxDistPass.currentIndex() - 1
@@ -241,13 +276,13 @@ class TabWidgetCards(TabWidgetBase):
             # "Pass X" option
             if self.comboBoxDistCard.currentIndex() == 0:
                 # "All (Pass-Wise Composite)" option
-                composite.buildFromPass(passData=distPassData)
-            elif self.comboBoxDistCard.currentIndex() > 0:
+                composite = index.composite(passes=[distPassData])
+            else:
                 # "Card X" option
                 card = distPassData.cards.card_list[
                     self.comboBoxDistCard.currentIndex() - 1
                 ]
-                composite.buildFromCard(card)
+                composite = index.composite_of_cards([card])
         composite.plotDistribution(
             mplWidget1=self.plotWidgetDropDist1,
             mplWidget2=self.plotWidgetDropDist2,
@@ -208,7 +208,7 @@ class CardManager(baseclass):
             if selected_card.has_image:
                 self.ui.buttonProcessOptions.setEnabled(True)
                 self.ui.buttonSpreadFactors.setEnabled(True)
-                imageWidget0.updateSprayCardView(selected_card.image_original())
+                imageWidget0.updateSprayCardImage(selected_card)
                 cvImg1, cvImg2 = selected_card.process_image(overlay=True, mask=True)
                 imageWidget1.updateSprayCardView(cvImg1)
                 imageWidget2.updateSprayCardView(cvImg2)
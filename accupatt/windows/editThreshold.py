@@ -1,11 +1,13 @@
 import copy
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 
+from pyqtgraph import InfiniteLine, PlotWidget
 from superqt import QLabeledRangeSlider, QLabeledSlider
 import accupatt.config as cfg
 from PyQt6 import uic
-from PyQt6.QtCore import Qt, pyqtSlot, QSignalBlocker
+from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot, QSignalBlocker, QTimer
 from PyQt6.QtWidgets import (
     QCheckBox,
     QComboBox,
@@ -17,7 +19,8 @@ from PyQt6.QtWidgets import (
     QSpinBox,
 )
 
-from accupatt.models.sprayCard import SprayCard
+from accupatt.models.seriesData import SeriesData
+from accupatt.models.sprayCard import SprayCard, SprayCardStats
 
 Ui_Form, baseclass = uic.loadUiType(
     os.path.join(os.getcwd(), "resources", "editThreshold.ui")
@@ -25,11 +28,29 @@ Ui_Form, baseclass = uic.loadUiType(
 
 
 class EditThreshold(baseclass):
+
+    full_view_ready = pyqtSignal(int, object, object)
+
     def __init__(self, sprayCard, passData, seriesData, parent=None):
         super().__init__(parent=parent)
         self.ui = Ui_Form()
         self.ui.setupUi(self)
 
+        # View updates are debounced so only the latest options get rendered. A
+        # downsampled preview is drawn while a slider is held, full resolution
+        # passes run on a worker thread and are dropped if superseded. Only one
+        # pass runs at a time, changes made while it runs are rendered after it.
+        self.view_timer = QTimer(self)
+        self.view_timer.setSingleShot(True)
+        self.view_timer.setInterval(30)
+        self.view_timer.timeout.connect(self._render_spray_card_view)
+        self.view_executor = ThreadPoolExecutor(max_workers=1)
+        self.view_future: Future = None
+        self.view_generation = 0
+        self.view_rerun = False
+        self.view_closed = False
+        self.full_view_ready.connect(self._full_view_ready)
+
         # Make a working copy
         self.sprayCard: SprayCard = copy.copy(sprayCard)
         # Get a handle to seriesData and passData to enable "Apply to all cards on save"
@@ -62,6 +83,10 @@ class EditThreshold(baseclass):
         self.ui.radioButtonManual.toggled.connect(self.toggleThresholdMethodGrayscale)
         self.ui.sliderGrayscale.setValue(self.sprayCard.threshold_grayscale)
         self.ui.sliderGrayscale.valueChanged[int].connect(self.updateThresholdGrayscale)
+        # Coverage vs threshold curve, drawn from the card's cached histogram
+        self.plotCoverage: PlotWidget = self.ui.plotWidgetCoverage
+        self.lineCoverage = InfiniteLine(pos=self.sprayCard.threshold_grayscale)
+        self._init_coverage_plot()
 
         # Populate color ui from spray card
         self.ui.checkBoxHue.setChecked(self.sprayCard.threshold_color_hue_pass)
@@ -99,6 +124,10 @@ class EditThreshold(baseclass):
             )
         )
         rs_bri.valueChanged[tuple].connect(self.updateBrightness)
+        # Full resolution pass once a slider is let go
+        self.sliders = [self.ui.sliderGrayscale, rs_hue, rs_sat, rs_bri]
+        for slider in self.sliders:
+            slider.sliderReleased.connect(self.updateSprayCardView)
 
         self.buttonAdvancedOptions: QPushButton = self.ui.buttonAdvancedOptions
         self.buttonAdvancedOptions.clicked.connect(self._clicked_advanced_options)
@@ -140,8 +169,21 @@ class EditThreshold(baseclass):
 
     def updateThresholdGrayscale(self, thresh):
         self.sprayCard.set_threshold_grayscale(threshold=thresh)
+        self.lineCoverage.setValue(thresh)
         self.updateSprayCardView()
 
+    def _init_coverage_plot(self):
+        pi = self.plotCoverage.plotItem
+        pi.setLabel(axis="bottom", text="Threshold")
+        pi.setLabel(axis="left", text="Coverage", units="%")
+        pi.showGrid(x=True, y=True)
+        pi.setMouseEnabled(x=False, y=False)
+        pi.hideButtons()
+        pi.setXRange(0, 255, padding=0)
+        if self.sprayCard.has_image:
+            pi.plot(x=np.arange(256), y=self.sprayCard.grayscale_coverage())
+        pi.addItem(self.lineCoverage)
+
     def toggleThresholdMethodGrayscale(self):
         method = cfg.THRESHOLD_GRAYSCALE_METHOD_AUTO
         if self.ui.radioButtonManual.isChecked():
@@ -182,7 +224,7 @@ class EditThreshold(baseclass):
 
     @pyqtSlot()
     def _clicked_advanced_options(self):
-        e = ProcessOptionsAdvanced(self.sprayCard, parent=self)
+        e = ProcessOptionsAdvanced(self.sprayCard, self.seriesData, parent=self)
         e.accepted.connect(self.updateSprayCardView)
         e.exec()
 
@@ -206,10 +248,53 @@ class EditThreshold(baseclass):
         self.ui.checkBoxApplyToAllPass.setEnabled(not boo)
 
     def updateSprayCardView(self):
-        if not self.sprayCard.has_image:
+        self.view_timer.start()
+
+    def _render_spray_card_view(self):
+        if self.view_closed or not self.sprayCard.has_image:
+            return
+        self.view_generation += 1
+        if any(slider.isSliderDown() for slider in self.sliders):
+            cvImg1, cvImg2 = self.sprayCard.preview_image(
+                max_size=cfg.THRESHOLD_PREVIEW_MAX_SIZE
+            )
+            self._show_spray_card_view(cvImg1, cvImg2)
+        elif self.view_future is not None and not self.view_future.done():
+            # Full resolution passes can't be interrupted, rather than queueing
+            # another behind it render the latest options once it finishes
+            self.view_rerun = True
+        else:
+            # Process a snapshot so further edits can't change options mid-pass,
+            # with stats of its own as processing resets them
+            generation = self.view_generation
+            card = copy.copy(self.sprayCard)
+            card.stats = SprayCardStats(sprayCard=card)
+            self.view_future = self.view_executor.submit(
+                card.process_image, overlay=True, mask=True
+            )
+            self.view_future.add_done_callback(
+                lambda f: self.full_view_ready.emit(generation, card, f)
+            )
+
+    @pyqtSlot(int, object, object)
+    def _full_view_ready(self, generation: int, card: SprayCard, future: Future):
+        # A pass finishing after the dialog closed may still be delivered
+        if self.view_closed:
+            return
+        if self.view_rerun:
+            self.view_rerun = False
+            self._render_spray_card_view()
+        # Drop results superseded by a later change
+        if generation != self.view_generation or future.cancelled():
             return
+        cvImg1, cvImg2 = future.result()
+        self.sprayCard.threshold_grayscale_calculated = (
+            card.threshold_grayscale_calculated
+        )
+        self._show_spray_card_view(cvImg1, cvImg2)
+
+    def _show_spray_card_view(self, cvImg1, cvImg2):
         # Left Image (1) Right Image (2)
-        cvImg1, cvImg2 = self.sprayCard.process_image(overlay=True, mask=True)
         self.ui.splitCardWidget.updateSprayCardView(cvImg1, cvImg2, self.fit)
         self.ui.labelGrayscaleThresholdCalculated.clear()
         if self.sprayCard.threshold_type == cfg.THRESHOLD_TYPE_GRAYSCALE:
@@ -238,6 +323,7 @@ class EditThreshold(baseclass):
             sc.set_threshold_grayscale(cfg.get_threshold_grayscale())
             with QSignalBlocker(self.ui.sliderGrayscale):
                 self.ui.sliderGrayscale.setValue(sc.threshold_grayscale)
+            self.lineCoverage.setValue(sc.threshold_grayscale)
         elif sc.threshold_type == cfg.THRESHOLD_TYPE_HSB:
             sc.set_threshold_color_hue(
                 min=cfg.get_threshold_hsb_hue_min(),
@@ -284,6 +370,7 @@ class EditThreshold(baseclass):
         sc.watershed = cfg.get_watershed()
         with QSignalBlocker(self.ui.checkBoxWatershed):
             self.ui.checkBoxWatershed.setChecked(sc.watershed)
+        sc.segmentation_engine = cfg.get_segmentation_engine()
         sc.min_stain_area_px = cfg.get_min_stain_area_px()
         with QSignalBlocker(self.ui.spinBoxMinSize):
             self.ui.spinBoxMinSize.setValue(sc.min_stain_area_px)
@@ -294,6 +381,15 @@ class EditThreshold(baseclass):
             )
         self.updateSprayCardView()
 
+    def done(self, r):
+        # Nothing left to render once closed
+        self.view_closed = True
+        self.view_rerun = False
+        self.view_timer.stop()
+        self.full_view_ready.disconnect(self._full_view_ready)
+        self.view_executor.shutdown(wait=False, cancel_futures=True)
+        super().done(r)
+
     def accept(self):
         sc = self.sprayCard
         # Cycle through passes
@@ -341,6 +437,7 @@ class EditThreshold(baseclass):
                             sc.flag_max_stain_limit_reached
                         )
                         card.watershed = sc.watershed
+                        card.segmentation_engine = sc.segmentation_engine
                         card.min_stain_area_px = sc.min_stain_area_px
                         card.stain_approximation_method = sc.stain_approximation_method
                         # Currency Flag
@@ -368,6 +465,7 @@ class EditThreshold(baseclass):
                     sc.threshold_color_brightness_pass
                 )
             cfg.set_watershed(sc.watershed)
+            cfg.set_segmentation_engine(sc.segmentation_engine)
             cfg.set_min_stain_area_px(sc.min_stain_area_px)
             cfg.set_stain_approximation_method(sc.stain_approximation_method)
         # Notify requestor
@@ -380,17 +478,41 @@ Ui_Form_2, baseclass_2 = uic.loadUiType(
 
 
 class ProcessOptionsAdvanced(baseclass_2):
-    def __init__(self, sprayCard: SprayCard, parent=None):
+    def __init__(self, sprayCard: SprayCard, seriesData: SeriesData, parent=None):
         super().__init__(parent=parent)
         self.ui = Ui_Form_2()
         self.ui.setupUi(self)
 
         self.sprayCard = sprayCard
+        self.seriesData = seriesData
 
         # Max stain count
         self.le_max: QLineEdit = self.ui.lineEditMaxStains
         self.le_max.setText(str(cfg.get_max_stain_count()))
 
+        # Number of worker processes used when processing many cards
+        self.sb_workers: QSpinBox = self.ui.spinBoxProcessWorkers
+        self.sb_workers.setValue(cfg.get_card_process_workers())
+
+        # Memory budget above which a card is segmented in bands
+        self.sb_memory: QSpinBox = self.ui.spinBoxProcessingMemory
+        self.sb_memory.setValue(cfg.get_processing_memory_mb())
+
+        # Resamples for droplet stat confidence intervals, 0 disables
+        self.sb_bootstrap: QSpinBox = self.ui.spinBoxBootstrapResamples
+        self.sb_bootstrap.setValue(cfg.get_bootstrap_resamples())
+
+        # Storage of card images as they are loaded
+        self.cb_codec: QComboBox = self.ui.comboBoxImageCodec
+        self.cb_codec.addItems(cfg.IMAGE_CODECS)
+        self.cb_codec.setCurrentText(cfg.get_image_codec())
+        self.sb_png: QSpinBox = self.ui.spinBoxPngCompression
+        self.sb_png.setValue(cfg.get_image_png_compression())
+        self.sb_png.setEnabled(self.cb_codec.currentText() == cfg.IMAGE_CODEC_PNG)
+        self.cb_codec.currentTextChanged[str].connect(
+            lambda codec: self.sb_png.setEnabled(codec == cfg.IMAGE_CODEC_PNG)
+        )
+
         # Populate Watershed
         self.cb_watershed: QCheckBox = self.ui.checkBoxWatershed
         self.cb_watershed.setCheckState(
@@ -399,6 +521,11 @@ class ProcessOptionsAdvanced(baseclass_2):
             else Qt.CheckState.Unchecked
         )
 
+        # Populate Segmentation Engine
+        self.cb_engine: QComboBox = self.ui.comboBoxSegmentationEngine
+        self.cb_engine.addItems(cfg.SEGMENTATION_ENGINES)
+        self.cb_engine.setCurrentText(self.sprayCard.segmentation_engine)
+
         # Populate Stain Approx Method
         self.cb_approx: QComboBox = self.ui.comboBoxApproximationMethod
         self.cb_approx.addItems(cfg.STAIN_APPROXIMATION_METHODS)
@@ -421,7 +548,18 @@ class ProcessOptionsAdvanced(baseclass_2):
             if msg == QMessageBox.StandardButton.Ok:
                 return
         cfg.set_max_stain_count(self.le_max.text())
+        cfg.set_card_process_workers(self.sb_workers.value())
+        cfg.set_processing_memory_mb(self.sb_memory.value())
+        if self.sb_bootstrap.value() != cfg.get_bootstrap_resamples():
+            cfg.set_bootstrap_resamples(self.sb_bootstrap.value())
+            # Confidence intervals of every card are recalculated
+            for p in self.seriesData.passes:
+                for card in p.cards.card_list:
+                    card.stats.current = False
+        cfg.set_image_codec(self.cb_codec.currentText())
+        cfg.set_image_png_compression(self.sb_png.value())
         self.sprayCard.watershed = self.cb_watershed.isChecked()
+        self.sprayCard.segmentation_engine = self.cb_engine.currentText()
         self.sprayCard.min_stain_area_px = self.sb_min.value()
         self.sprayCard.stain_approximation_method = self.cb_approx.currentText()
         super().accept()
@@ -1,4 +1,5 @@
-import operator
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import os
 
 from send2trash import send2trash
@@ -7,10 +8,15 @@ import accupatt.config as cfg
 import cv2
 import numpy as np
 import pyqtgraph as pg
-from accupatt.models.sprayCard import SprayCard
-from PIL import Image
+import accupatt.helpers.imagePyramid as imagePyramid
+from accupatt.helpers.scannedSheet import ScannedSheet, scale_roi, sort_rois
+from accupatt.models.sprayCard import (
+    SprayCard,
+    SprayCardSheetProcessor,
+    sprayCardImageFileHandler,
+)
 from PyQt6 import uic
-from PyQt6.QtGui import QCursor, QImageReader, QPixmap
+from PyQt6.QtGui import QCursor, QImage, QPixmap
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot, QRectF
 from PyQt6.QtWidgets import (
     QApplication,
@@ -31,6 +37,10 @@ Ui_Form_Pre, baseclass_pre = uic.loadUiType(
     os.path.join(os.getcwd(), "resources", "loadCardsPreBatch.ui")
 )
 
+# Sheets decoded at once when loading a batch, each is held decoded along with
+# its encoded cards until saved
+MAX_CONCURRENT_SHEETS = 2
+
 
 class LoadCards(baseclass):
 
@@ -62,9 +72,13 @@ class LoadCards(baseclass):
         )
         self.ui.comboBoxScale.addItems([f"{s}%" for s in cfg.ROI_SCALES])
         self.ui.comboBoxScale.setCurrentIndex(cfg.ROI_SCALES.index(self.scale))
+        self.ui.checkBoxProcess.setChecked(cfg.get_image_process_on_load())
 
-        # Image File
+        # Image File, read and decoded once for preview, detection and cropping
         self.image_file = image_file
+        self.sheet = ScannedSheet(
+            image_file, flip_x=cfg.get_image_flip_x(), flip_y=cfg.get_image_flip_y()
+        )
 
         # List of cards
         self.card_list = card_list
@@ -95,51 +109,44 @@ class LoadCards(baseclass):
         self.show_image_characteristics()
 
     def plot_image(self):
-        # Load Image from File, invert vertically, add it to plotWidget
-        image_reader = QImageReader(self.image_file)
-        size_og = image_reader.size()
-        size_mod = size_og
-        if size_og.width() * size_og.height() > 33000000:
-            scale = min([2000 / size_mod.width(), 2000 / size_mod.height()])
-            size_mod = size_mod.scaled(
-                int(size_mod.width() * scale),
-                int(size_mod.height() * scale),
-                Qt.AspectRatioMode.IgnoreAspectRatio,
-            )
-        image_reader.setScaledSize(size_mod)
-        self.img = image_reader.read()
-        self.img = self.img.scaled(size_og.width(), size_og.height())
-        self.img = self.img.mirrored(
-            horizontal=cfg.get_image_flip_x(), vertical=cfg.get_image_flip_y()
+        # Show the reduced level of the sheet, scaled so the view is in full
+        # resolution pixels, invert vertically, add it to plotWidget
+        self.sheet.set_flip(cfg.get_image_flip_x(), cfg.get_image_flip_y())
+        reduced = self.sheet.reduced
+        height, width = reduced.shape[:2]
+        self.img_pixmap = QPixmap.fromImage(
+            QImage(reduced.data, width, height, 3 * width, QImage.Format.Format_BGR888)
         )
-        self.img_pixmap = QPixmap.fromImage(self.img)
         self.img = QGraphicsPixmapItem(self.img_pixmap)
+        self.img.setScale(self.sheet.reduction)
 
         self.ui.plotWidget.clear()
         self.ui.plotWidget.addItem(self.img)
         self.ui.plotWidget.getPlotItem().invertY(True)
 
-        # Use PIL to get Image DPI
-        self.dpi = round(Image.open(self.image_file).info["dpi"][0])
+        # Image DPI read from the same file bytes
+        if self.sheet.dpi:
+            self.dpi = self.sheet.dpi
         self.ui.comboBoxDPI.setCurrentText(str(self.dpi))
         self.show_image_characteristics()
 
         # Only search image for ROIs once
-        self.roi_rectangles = self._find_rois(self.image_file)
+        self.roi_rectangles = self.sheet.find_rois()
         # Run initial drawing of ROIs
         self.rois = []
         self.draw_rois()
 
     def show_image_characteristics(self):
         dpi = self.dpi
-        h_px = self.img.pixmap().height()
-        w_px = self.img.pixmap().width()
+        h_px, w_px = self.sheet.image.shape[:2]
         self.ui.label_size.setText(f'{(w_px/dpi):.1f}"x{(h_px/dpi):.1f}"')
         self.ui.label_pixel_area.setText(f"{int(25400 / dpi)} microns")
 
     def draw_rois(self):
         # Order card rectangles based on selected options
-        self._sort_rois(self.orientation, self.order)
+        self.roi_rectangles = sort_rois(
+            self.roi_rectangles, self.orientation, self.order
+        )
         # Clear any previous rois from ViewBox
         for r in self.rois:
             self.ui.plotWidget.getViewBox().removeItem(r)
@@ -166,7 +173,7 @@ class LoadCards(baseclass):
                 text = self.card_list[i].name
                 label = pg.TextItem(text=text, color="m")
                 label.setParentItem(roi)
-                roi.setParentItem(self.img)
+                self.ui.plotWidget.addItem(roi)
                 roi.setAcceptedMouseButtons(Qt.MouseButton.LeftButton)
                 roi.sigClicked.connect(self.roi_clicked)
                 roi.sigRemoveRequested.connect(self.remove_roi)
@@ -301,43 +308,67 @@ class LoadCards(baseclass):
         )
         cfg.set_image_roi_acquisition_order(self.ui.comboBoxOrder.currentText())
         cfg.set_image_roi_scale(cfg.ROI_SCALES[self.ui.comboBoxScale.currentIndex()])
+        process = self.ui.checkBoxProcess.isChecked()
+        cfg.set_image_process_on_load(process)
 
         prog = QProgressDialog(self)
         prog.setMinimumDuration(0)
         prog.setWindowModality(Qt.WindowModality.WindowModal)
+        # One step per card encoded, one for the database write and one for
+        # processing if asked for
+        prog.setRange(0, len(self.rois) + 1 + process)
 
-        for i, roi in enumerate(self.rois):
-            if i == 0:
-                prog.setRange(0, len(self.rois))
-            prog.setValue(i)
-            prog.setLabelText(
-                f"Cropping {self.card_list[i].name} and saving to the database"
-            )
-            if prog.wasCanceled():
-                return
+        # Each card is a view into the already decoded sheet
+        rects = []
+        for roi in self.rois:
             roi: pg.RectROI
             x = int(roi.pos()[0])
             y = int(roi.pos()[1])
             w = int(roi.size()[0])
             h = int(roi.size()[1])
-            # Use CV to crop image roi
-            img = cv2.imread(self.image_file)
-            # Flip as needed
-            if cfg.get_image_flip_x():
-                img = cv2.flip(img, 1)
-            if cfg.get_image_flip_y():
-                img = cv2.flip(img, 0)
-            img_crop = img[y : y + h, x : x + w]
-            # Save to bytestream
-            _, buffer = cv2.imencode("*.png", img_crop)
-            # Write to db and update spray card object
-            sprayCard: SprayCard = self.card_list[i]
-            sprayCard.save_image_to_file(buffer)
+            rects.append((x, y, w, h))
+        crops = [self.sheet.crop(rect) for rect in rects]
+        cards: list[SprayCard] = self.card_list[: len(crops)]
+        # Encode cards and their reduced levels concurrently, cv2 releases the
+        # GIL while encoding
+        codec = cfg.get_image_codec()
+        png_compression = cfg.get_image_png_compression()
+        buffers = [None] * len(crops)
+        with ThreadPoolExecutor() as executor:
+            # Cards may be processed from the sheet while they encode
+            processing = None
+            if process:
+                processing = executor.submit(
+                    SprayCardSheetProcessor(
+                        self.sheet.image, rects[: len(cards)], cards
+                    ).process
+                )
+            futures = {
+                executor.submit(imagePyramid.encode, crop, codec, png_compression): i
+                for i, crop in enumerate(crops)
+            }
+            for num_complete, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                buffers[i] = future.result()
+                prog.setValue(num_complete)
+                prog.setLabelText(f"Cropped and encoded {self.card_list[i].name}")
+                if prog.wasCanceled():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return
+        # Write all cards to db in one transaction and update spray card objects
+        prog.setLabelText(f"Saving {len(buffers)} cards to the database")
+        sprayCardImageFileHandler.save_images_to_file(
+            cards, [b for b, _ in buffers], codec, [t for _, t in buffers]
+        )
+        for sprayCard in cards:
             sprayCard.has_image = True
             sprayCard.include_in_composite = True
             sprayCard.dpi = self.dpi
-            if i == len(self.rois) - 1:
-                prog.setValue(i + 1)
+        prog.setValue(len(self.rois) + 1)
+        if processing is not None:
+            prog.setLabelText("Calculating droplet statistics")
+            _apply_processed_cards(cards, processing.result())
+            prog.setValue(len(self.rois) + 2)
 
         self.prompt_to_delete_original()
         super().accept()
@@ -358,83 +389,6 @@ class LoadCards(baseclass):
         if msg.clickedButton() == button_delete:
             send2trash(os.path.abspath(self.image_file))
 
-    def _sort_rois(self, orientation, order):
-        rois_original = self.roi_rectangles.copy()
-        rois_sorted = []
-        # Loop through all rois, removing from old list as added to new sorted list
-        while len(rois_sorted) < len(self.roi_rectangles):
-            # Compute distance from origin for each
-            dists_from_origin = []
-            for r in rois_original:
-                x, y, w, h = r
-                dists_from_origin.append(np.sqrt(x**2 + y**2))
-            # Sort rois by dist to origin, grab one nearest origin
-            x1, y1, w1, h1 = [
-                r for _, r in sorted(zip(dists_from_origin, rois_original))
-            ][0]
-            # Create intermediate list for current row/column of first_roi
-            current = []
-            for r in rois_original:
-                x, y, w, h = r
-                # Check if in same row/col as first_roi, if so add to list
-                if orientation == "Horizontal":
-                    y_c = y + h / 2
-                    if y_c >= y1 and y_c <= y1 + h1:
-                        current.append(r)
-                else:
-                    x_c = x + w / 2
-                    if x_c >= x1 and x_c <= x1 + w1:
-                        current.append(r)
-            # Sort current row/col list
-            current = sorted(
-                current,
-                key=operator.itemgetter(0 if orientation == "Horizontal" else 1),
-                reverse=(order == "Decreasing"),
-            )
-            # Add sorted row/column to either beginning or end of new list
-            if order == "Decreasing":
-                rois_sorted[0:0] = current
-            else:
-                rois_sorted.extend(current)
-            # Remove current row/col rois from original list
-            rois_original = [r for r in rois_original if r not in current]
-        # Once rois_sorted contains all original rois, re-assign the original rois
-        self.roi_rectangles = rois_sorted
-
-    def _find_rois(self, image_file):
-        img = cv2.imread(image_file)
-        if cfg.get_image_flip_x():
-            img = cv2.flip(img, 1)
-        if cfg.get_image_flip_y():
-            img = cv2.flip(img, 0)
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, img_thresh = cv2.threshold(
-            img_gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
-        )
-        # cv2.imshow('thresh',img_thresh)
-        # Use img_thresh to find contours
-        contours, _ = cv2.findContours(
-            img_thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
-        )
-
-        roi_rectangles = []
-        for c in contours:
-            # Check if in bounds
-            x, y, w, h = cv2.boundingRect(c)
-            # If bounding box is less than 5% of w or h of image, reject it
-            if w < 0.05 * img.shape[1] or h < 0.05 * img.shape[0]:
-                continue
-            # If contour touches edge, fail
-            if (
-                x <= 0
-                or y <= 0
-                or (x + w) >= img.shape[1] - 1
-                or (y + h) >= img.shape[0] - 1
-            ):
-                continue
-            roi_rectangles.append((x, y, w, h))
-        return roi_rectangles
-
 
 class LoadCardsPreBatch(baseclass_pre):
     def __init__(self, image_files: list[str], card_list: list[SprayCard], parent=None):
@@ -454,28 +408,240 @@ class LoadCardsPreBatch(baseclass_pre):
         self.lwf.addItems(self.files)
         self.cbd.addItem("Auto")
         self.cbd.addItems([str(dpi) for dpi in cfg.IMAGE_DPI_OPTIONS])
+        self.cbp: QCheckBox = self.ui.checkBoxProcess
+        self.cbp.setChecked(cfg.get_image_process_on_load())
+        # Cards are only processed from the sheet when cropped from it
+        self.cbc.toggled[bool].connect(self.cbp.setEnabled)
 
         self.show()
 
     def accept(self):
-        if self.cbc.isChecked():
-            # TODO Send to Load Cards in loop
-            pass
+        files = [self.lwf.item(i).text() for i in range(self.lwf.count())]
+        crop = self.cbc.isChecked()
+        if not crop:
+            # One card per file, files past the selected cards are not read
+            files = files[: len(self.cards)]
+        # Crop (or take whole), encode and save each file in turn. Cards saved
+        # before any cancel are kept
+        lines, num_crops, num_failed = self._load_files(
+            files, crop, cfg.get_image_codec()
+        )
+        if num_failed or (crop and num_crops != len(self.cards)):
+            self._report_crops(files, lines, num_crops, num_failed)
+        super().accept()
+
+    def _dpi(self, file_dpi: int) -> int:
+        # Auto uses the file's dpi where recorded
+        if self.cbd.currentIndex() == 0:
+            return file_dpi if file_dpi else cfg.get_image_dpi()
+        return int(self.cbd.currentText())
+
+    def _load_files(
+        self, files: list[str], crop: bool, codec: str
+    ) -> tuple[list[str], int, int]:
+        # Summary line per file, number of cards found and of files that could
+        # not be read. Files are loaded a few at a time and saved in order as
+        # each completes, so only those in flight are held in memory
+        encoding = (codec, cfg.get_image_png_compression())
+        if crop:
+            process = self.cbp.isChecked() and len(self.cards) > 0
+            cfg.set_image_process_on_load(self.cbp.isChecked())
+            worker = _crop_sheet
+            options = (
+                cfg.get_image_flip_x(),
+                cfg.get_image_flip_y(),
+                cfg.get_image_roi_acquisition_orientation(),
+                cfg.get_image_roi_acquisition_order(),
+                cfg.get_image_roi_scale(),
+                *encoding,
+                self.cards if process else None,
+                cfg.get_processing_memory_mb(),
+            )
         else:
-            # Go ahead and load as is
-            for i in range(self.lwf.count()):
-                if i < len(self.cards):
-                    with open(self.lwf.item(i).text(), "rb") as file:
-                        binary_data = file.read()
-                    c = self.cards[i]
-                    c.has_image = True
-                    c.include_in_composite = True
-                    if self.cbd.currentIndex() == 0:
-                        c.dpi = round(
-                            Image.open(self.lwf.item(i).text()).info["dpi"][0]
-                        )
+            worker, options = _encode_file, encoding
+        # Each sheet's first card, known once the sheet before it is cropped
+        first_card = Future()
+        first_card.set_result(0)
+        prog = QProgressDialog(self)
+        prog.setMinimumDuration(0)
+        prog.setWindowModality(Qt.WindowModality.WindowModal)
+        prog.setRange(0, len(files))
+        lines = []
+        num_crops = 0
+        num_failed = 0
+        max_workers = max(1, min(cfg.get_card_process_workers(), MAX_CONCURRENT_SHEETS))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            next_file = 0
+            while pending or next_file < len(files):
+                # Files past the last card to assign are not read
+                while (
+                    next_file < len(files)
+                    and len(pending) < max_workers
+                    and num_crops < len(self.cards)
+                ):
+                    if crop:
+                        next_card = Future()
+                        chain = (first_card, next_card)
+                        first_card = next_card
                     else:
-                        c.dpi = int(self.cbd.currentText())
-                    c.save_image_to_file(image=binary_data)
+                        chain = ()
+                    pending.append(
+                        executor.submit(worker, files[next_file], *options, *chain)
+                    )
+                    next_file += 1
+                if not pending:
+                    break
+                i = len(lines)
+                name = os.path.basename(files[i])
+                try:
+                    dpi, buffers, processed = pending.popleft().result()
+                except Exception as e:
+                    # Its cards go to the files after it
+                    lines.append(f"{name}: could not be read ({e})")
+                    num_failed += 1
+                    dpi, buffers, processed = None, [], []
+                else:
+                    lines.append(
+                        self._save_file(
+                            files[i], codec, dpi, buffers, processed, num_crops
+                        )
+                    )
+                num_crops += len(buffers)
+                prog.setValue(i + 1)
+                prog.setLabelText(
+                    f"Cropped and saved {len(buffers)} cards from {name}"
+                    if crop
+                    else f"Loaded {name}"
+                )
+                # Release the sheet's images before waiting on the next
+                del buffers, processed
+                if prog.wasCanceled():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+        prog.setValue(len(files))
+        return lines, num_crops, num_failed
+
+    def _save_file(
+        self,
+        file: str,
+        codec: str,
+        dpi: int,
+        buffers: list,
+        processed: list,
+        first_card: int,
+    ) -> str:
+        # Assign a file's images to the next cards, save them in one transaction
+        # and adopt any processing. Returns the file's summary line
+        cards = self.cards[first_card : first_card + len(buffers)]
+        name = os.path.basename(file)
+        if not buffers:
+            return f"{name}: no cards detected"
+        if not cards:
+            return f"{name}: {len(buffers)} cards, none left to assign"
+        sprayCardImageFileHandler.save_images_to_file(
+            cards,
+            [b for b, _ in buffers[: len(cards)]],
+            codec,
+            [t for _, t in buffers[: len(cards)]],
+        )
+        for c in cards:
+            c.has_image = True
+            c.include_in_composite = True
+            c.dpi = self._dpi(dpi)
+        _apply_processed_cards(cards, processed)
+        return (
+            f"{name}: {len(buffers)} cards at {self._dpi(dpi)} dpi -> "
+            f"{cards[0].name}" + (f" to {cards[-1].name}" if len(cards) > 1 else "")
+        )
 
-        super().accept()
+    def _report_crops(
+        self, files: list[str], lines: list[str], num_crops: int, num_failed: int
+    ):
+        # One summary of all sheets in place of a dialog per sheet
+        msg = QMessageBox(self)
+        msg.setIcon(
+            QMessageBox.Icon.Warning if num_failed else QMessageBox.Icon.Information
+        )
+        msg.setWindowTitle("Loaded Cards")
+        msg.setText(
+            f"Detected {num_crops} cards on {len(lines)} of {len(files)} sheets for {len(self.cards)} selected cards."
+        )
+        notes = []
+        if num_failed:
+            notes.append(f"{num_failed} files could not be read, see details.")
+        if num_crops > len(self.cards):
+            notes.append(
+                f"The last {num_crops - len(self.cards)} detected cards were not loaded."
+            )
+        elif num_crops < len(self.cards):
+            notes.append(
+                f"{len(self.cards) - num_crops} selected cards did not receive an image."
+            )
+        msg.setInformativeText("\n".join(notes))
+        msg.setDetailedText("\n".join(lines))
+        msg.exec()
+
+
+def _apply_processed_cards(cards: list[SprayCard], processed: list[SprayCard]):
+    # Adopt stains of cards processed from the sheet, once their images are saved
+    for card, processed_card in zip(cards, processed):
+        if processed_card is not None:
+            card.apply_processing_results(processed_card)
+            card.stats.set_volumetric_stats()
+
+
+# Worker for LoadCardsPreBatch, detects and crops the cards of one sheet as LoadCards
+# would. If given cards, the sheet's cards are processed as the cards they are
+# assigned to, starting at first_card (set by the previous sheet's worker). The
+# card after this sheet's is passed on through next_card
+def _crop_sheet(
+    image_file: str,
+    flip_x: bool,
+    flip_y: bool,
+    orientation: str,
+    order: str,
+    scale: int,
+    codec: str,
+    png_compression: int,
+    cards: list[SprayCard] = None,
+    memory_mb: int = None,
+    first_card: Future = None,
+    next_card: Future = None,
+) -> tuple[int, list, list]:
+    try:
+        sheet = ScannedSheet(image_file, flip_x=flip_x, flip_y=flip_y)
+        rects = [
+            scale_roi(rect, scale)
+            for rect in sort_rois(sheet.find_rois(), orientation, order)
+        ]
+    except Exception:
+        # An unreadable sheet takes no cards, they go to the sheets after it
+        _pass_on_cards(first_card, next_card, 0)
+        raise
+    start = _pass_on_cards(first_card, next_card, len(rects))
+    processed = [None] * len(rects)
+    if cards is not None and (templates := cards[start : start + len(rects)]):
+        processed[: len(templates)] = SprayCardSheetProcessor(
+            sheet.image, rects[: len(templates)], templates, memory_mb
+        ).process()
+    buffers = [
+        imagePyramid.encode(sheet.crop(rect), codec, png_compression) for rect in rects
+    ]
+    return sheet.dpi, buffers, processed
+
+
+def _pass_on_cards(first_card: Future, next_card: Future, num_cards: int) -> int:
+    # First card of a sheet taking num_cards, setting that of the sheet after it
+    start = 0 if first_card is None else first_card.result()
+    if next_card is not None:
+        next_card.set_result(start + num_cards)
+    return start
+
+
+# Worker for LoadCardsPreBatch, loads a file as one card
+def _encode_file(
+    image_file: str, codec: str, png_compression: int
+) -> tuple[int, list, list]:
+    sheet = ScannedSheet(image_file)
+    return sheet.dpi, [imagePyramid.encode(sheet.image, codec, png_compression)], [None]
@@ -8,7 +8,11 @@ from accupatt.helpers.dataFileImporter import (
     convert_xlsx_to_db,
     load_from_accupatt_1_file,
 )
-from accupatt.helpers.dBBridge import load_from_db, save_to_db
+from accupatt.helpers.dBBridge import (
+    close_image_connections,
+    load_from_db,
+    save_to_db,
+)
 from accupatt.helpers.exportExcel import export_all_to_excel, safe_report
 from accupatt.helpers.reportMaker import ReportMaker
 from accupatt.models.dye import Dye
@@ -277,6 +281,7 @@ class MainWindow(baseclass):
             if file is None or file == "":
                 return False
             if os.path.exists(file):
+                close_image_connections(file)
                 send2trash(os.path.abspath(file))
             self.change_current_file(file)
         # If db file exists, or a new one has been created, update persistent vals for Flyin
@@ -346,6 +351,9 @@ class MainWindow(baseclass):
         self.tabWidget.setCurrentIndex(0)
 
     def change_current_file(self, file: str):
+        # Image reads on the previous file end with it
+        if self.currentFile and self.currentFile != file:
+            close_image_connections(self.currentFile)
         self.currentFile = file
         # Set directory if file exists
         if file != "":
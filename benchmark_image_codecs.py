@@ -0,0 +1,90 @@
+"""
+Stores every card image of one or more AccuPatt .db files (or image files, each
+taken as one card) with each image codec and reports encode time, decode time
+and the size of a database holding them, to choose the image storage option.
+
+Usage: python benchmark_image_codecs.py FILE [FILE ...] [--png-levels 1,3,6,9]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import cv2
+
+import accupatt.config as cfg
+import accupatt.helpers.imageCodec as imageCodec
+from accupatt.helpers.dBBridge import load_from_db
+from accupatt.models.seriesData import SeriesData
+
+
+def load_images(files: list[str]) -> list:
+    images = []
+    for file in files:
+        if file.endswith(".db"):
+            s = SeriesData()
+            load_from_db(file, s)
+            for p in s.passes:
+                images.extend(
+                    card.image_original()
+                    for card in p.cards.card_list
+                    if card.has_image
+                )
+        else:
+            images.append(cv2.imread(file, cv2.IMREAD_COLOR))
+    return images
+
+
+def run(images: list, codec: str, png_compression: int) -> tuple[float, float, int]:
+    fd, db = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        pre = time.perf_counter()
+        blobs = [imageCodec.encode(img, codec, png_compression) for img in images]
+        t_encode = time.perf_counter() - pre
+        with sqlite3.connect(db) as conn:
+            conn.execute("""CREATE TABLE images (id INTEGER PRIMARY KEY, image BLOB)""")
+            conn.executemany(
+                """INSERT INTO images (image) VALUES (?)""",
+                [(sqlite3.Binary(b),) for b in blobs],
+            )
+        conn.close()
+        # Read back from the database as when opening cards
+        pre = time.perf_counter()
+        with sqlite3.connect(db) as conn:
+            for (blob,) in conn.execute("""SELECT image FROM images"""):
+                imageCodec.decode(blob, codec)
+        conn.close()
+        t_decode = time.perf_counter() - pre
+        return t_encode, t_decode, os.path.getsize(db)
+    finally:
+        os.remove(db)
+
+
+def main(files: list[str], png_levels: list[int]):
+    images = load_images(files)
+    megapixels = sum(img.shape[0] * img.shape[1] for img in images) / 1e6
+    print(f"{len(images)} images, {megapixels:.1f} MP")
+    print("codec | encode sec | decode sec | db MB")
+    options = [(cfg.IMAGE_CODEC_PNG, level) for level in png_levels] + [
+        (codec, None) for codec in cfg.IMAGE_CODECS if codec != cfg.IMAGE_CODEC_PNG
+    ]
+    for codec, level in options:
+        t_encode, t_decode, size = run(
+            images,
+            codec,
+            cfg.IMAGE_PNG_COMPRESSION__DEFAULT if level is None else level,
+        )
+        name = codec if level is None else f"{codec} {level}"
+        print(f"{name} | {t_encode:.3f} | {t_decode:.3f} | {size / 2**20:.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    png_levels = [1, 3, 6, 9]
+    if "--png-levels" in args:
+        i = args.index("--png-levels")
+        png_levels = [int(level) for level in args[i + 1].split(",")]
+        del args[i : i + 2]
+    main(args, png_levels)
@@ -0,0 +1,104 @@
+"""
+Reads every card image of one or more AccuPatt .db files with each image read
+path and reports time per card and the bytes allocated reading it beyond the
+decoded image itself, i.e. copies of the stored blob (raw images are a view of
+the blob, so they count none). Cards are stored again
+with each image codec to compare. Decoded image caching is bypassed.
+
+Usage: python benchmark_image_reads.py FILE [FILE ...] [--repeat 3]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import accupatt.config as cfg
+import accupatt.helpers.dBBridge as dBBridge
+import accupatt.helpers.imageCodec as imageCodec
+from benchmark_image_codecs import load_images
+
+
+def read_fresh_connection(file: str, id: str):
+    # Read path before pooled connections: new connection and a bytearray copy
+    with sqlite3.connect(file) as conn:
+        image, codec = conn.execute(
+            """SELECT image, image_codec FROM spray_cards WHERE id = ?""", (id,)
+        ).fetchone()
+        byte_array = bytearray(image)
+    return imageCodec.decode(byte_array, codec)
+
+
+def read_pooled(file: str, id: str):
+    # Current read path: file's read connection, decoded in place of the blob
+    return imageCodec.decode(*dBBridge.load_image_from_db(file, id))
+
+
+READERS = {
+    "fresh connection": read_fresh_connection,
+    "pooled": read_pooled,
+}
+
+
+def store(images: list, codec: str) -> tuple[str, list[str]]:
+    fd, db = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    ids = [str(i) for i in range(len(images))]
+    with sqlite3.connect(db) as conn:
+        conn.execute(
+            """CREATE TABLE spray_cards (id TEXT PRIMARY KEY, image BLOB, image_codec TEXT)"""
+        )
+        conn.executemany(
+            """INSERT INTO spray_cards (id, image, image_codec) VALUES (?, ?, ?)""",
+            [
+                (id, sqlite3.Binary(imageCodec.encode(img, codec)), codec)
+                for id, img in zip(ids, images)
+            ],
+        )
+    conn.close()
+    return db, ids
+
+
+def run(reader, db: str, ids: list[str], repeat: int) -> tuple[float, float]:
+    # Seconds and extra bytes allocated per card, best of repeat
+    reader(db, ids[0])
+    t_best, extra_best = float("inf"), float("inf")
+    for _ in range(repeat):
+        t, extra = 0.0, 0
+        for id in ids:
+            tracemalloc.start()
+            pre = time.perf_counter()
+            img = reader(db, id)
+            t += time.perf_counter() - pre
+            extra += tracemalloc.get_traced_memory()[1] - img.nbytes
+            tracemalloc.stop()
+        t_best = min(t_best, t / len(ids))
+        extra_best = min(extra_best, extra / len(ids))
+    return t_best, extra_best
+
+
+def main(files: list[str], repeat: int):
+    images = load_images(files)
+    mb = sum(img.nbytes for img in images) / len(images) / 2**20
+    print(f"{len(images)} images, {mb:.1f} MB decoded per card")
+    print("codec | read path | ms per card | extra MB per card")
+    for codec in cfg.IMAGE_CODECS:
+        db, ids = store(images, codec)
+        try:
+            for name, reader in READERS.items():
+                t, extra = run(reader, db, ids, repeat)
+                print(f"{codec} | {name} | {t * 1000:.1f} | {extra / 2**20:.1f}")
+        finally:
+            dBBridge.close_image_connections(db)
+            os.remove(db)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 3
+    if "--repeat" in args:
+        i = args.index("--repeat")
+        repeat = int(args[i + 1])
+        del args[i : i + 2]
+    main(args, repeat)
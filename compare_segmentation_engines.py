@@ -0,0 +1,114 @@
+"""
+Runs every card of one or more AccuPatt .db files through each segmentation
+engine, with each stain approximation method, and reports stain count, DV,
+coverage, deposition and timing differences against scikit-image. Exits with
+status 1 if any engine differs from it by more than TOLERANCE.
+
+Usage: python compare_segmentation_engines.py FILE.db [FILE.db ...] [--watershed] [--no-watershed]
+"""
+import copy
+import sys
+import time
+
+import accupatt.config as cfg
+from accupatt.helpers.dBBridge import load_from_db
+from accupatt.models.seriesData import SeriesData
+from accupatt.models.sprayCard import SprayCard, SprayCardStats
+
+# Largest relative difference from scikit-image accepted in any compared value,
+# which itself varies slightly between runs with cv2.distanceTransform
+TOLERANCE = 0.01
+
+
+def run(card: SprayCard, engine: str, watershed: bool, approximation: str):
+    c = copy.copy(card)
+    c.stats = SprayCardStats(sprayCard=c)
+    c.segmentation_engine = engine
+    c.watershed = watershed
+    c.stain_approximation_method = approximation
+    pre = time.perf_counter()
+    c.process_image()
+    elapsed = time.perf_counter() - pre
+    c.stats.set_volumetric_stats()
+    return c, elapsed
+
+
+def values(c: SprayCard) -> dict:
+    return {
+        "valid": c.stats.get_number_of_stains(),
+        "dv01": c.stats.dv01,
+        "dv05": c.stats.dv05,
+        "dv09": c.stats.dv09,
+        "cov %": c.stats.get_percent_coverage(),
+        "gpa": c.stats.gpa,
+    }
+
+
+def difference(value, reference) -> float:
+    if value == reference:
+        return 0.0
+    return abs(value - reference) / max(abs(value), abs(reference))
+
+
+def main(files: list[str], watershed_options: list[bool]) -> int:
+    reference = cfg.SEGMENTATION_ENGINE_SKIMAGE
+    others = [e for e in cfg.SEGMENTATION_ENGINES if e != reference]
+    totals = {e: 0.0 for e in cfg.SEGMENTATION_ENGINES}
+    worst = {e: (0.0, "") for e in others}
+    print(
+        "file | pass | card | watershed | approximation | engine | stains | valid | dv01 | dv05 | dv09 | cov % | gpa | sec"
+    )
+    for file in files:
+        s = SeriesData()
+        load_from_db(file, s)
+        for p in s.passes:
+            for card in p.cards.card_list:
+                if not card.has_image:
+                    continue
+                for watershed in watershed_options:
+                    for approximation in cfg.STAIN_APPROXIMATION_METHODS:
+                        ref, t_ref = run(card, reference, watershed, approximation)
+                        totals[reference] += t_ref
+                        ref_values = values(ref)
+                        rows = [(reference, ref, t_ref)]
+                        for engine in others:
+                            c, t = run(card, engine, watershed, approximation)
+                            totals[engine] += t
+                            rows.append((engine, c, t))
+                            for key, value in values(c).items():
+                                diff = difference(value, ref_values[key])
+                                if diff > worst[engine][0]:
+                                    worst[engine] = (
+                                        diff,
+                                        f"{key} of {file} | {p.name} | {card.name} | "
+                                        f"{watershed} | {approximation}",
+                                    )
+                        for engine, c, t in rows:
+                            print(
+                                f"{file} | {p.name} | {card.name} | {watershed} | "
+                                f"{approximation} | {engine} | {len(c.stains)} | "
+                                f"{c.stats.get_number_of_stains()} | {c.stats.dv01} | "
+                                f"{c.stats.dv05} | {c.stats.dv09} | "
+                                f"{c.stats.get_percent_coverage():.3f} | "
+                                f"{c.stats.gpa:.3f} | {t:.3f}"
+                            )
+    for engine in cfg.SEGMENTATION_ENGINES:
+        print(f"{engine}: {totals[engine]:.2f} sec total")
+    failed = False
+    for engine in others:
+        diff, where = worst[engine]
+        print(f"{engine}: max relative difference = {diff:.2%} {where}")
+        if diff > TOLERANCE:
+            print(f"{engine}: FAILED, above the {TOLERANCE:.0%} tolerance")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    watershed_options = [True, False]
+    if "--watershed" in args:
+        watershed_options = [True]
+    elif "--no-watershed" in args:
+        watershed_options = [False]
+    sys.exit(main([a for a in args if not a.startswith("--")], watershed_options))
@@ -0,0 +1,29 @@
+"""segmentation_engine to spray_cards
+
+Revision ID: 5a9d3e7b1f60
+Revises: c4e81f0a2d95
+Create Date: 2026-10-18 13:41:27.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5a9d3e7b1f60"
+down_revision = "c4e81f0a2d95"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("spray_cards", sa.Column("segmentation_engine", sa.String))
+    # Migrate
+    conn = op.get_bind()
+    conn.execute(
+        """UPDATE spray_cards SET segmentation_engine = ?""", ("scikit-image",)
+    )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,38 @@
+"""spray_card_thumbnails table
+
+Revision ID: 8f3b1c6a9d27
+Revises: e2b7c5d8a413
+Create Date: 2026-10-18 18:22:37.504118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8f3b1c6a9d27"
+down_revision = "e2b7c5d8a413"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Levels of existing images are built as each card is first viewed
+    op.create_table(
+        "spray_card_thumbnails",
+        sa.Column(
+            "spray_card_id",
+            sa.String,
+            sa.ForeignKey("spray_cards.id"),
+            primary_key=True,
+        ),
+        sa.Column("level", sa.Integer, primary_key=True),
+        sa.Column("width", sa.Integer),
+        sa.Column("height", sa.Integer),
+        sa.Column("image", sa.LargeBinary),
+        sa.Column("image_codec", sa.String),
+    )
+
+
+def downgrade():
+    op.drop_table("spray_card_thumbnails")
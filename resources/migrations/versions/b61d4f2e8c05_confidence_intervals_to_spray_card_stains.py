@@ -0,0 +1,25 @@
+"""confidence_intervals to spray_card_stains
+
+Revision ID: b61d4f2e8c05
+Revises: 8f3b1c6a9d27
+Create Date: 2026-10-18 21:04:12.630477
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b61d4f2e8c05"
+down_revision = "8f3b1c6a9d27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing cache entries were keyed without bootstrapping and have no intervals
+    op.add_column("spray_card_stains", sa.Column("confidence_intervals", sa.String))
+
+
+def downgrade():
+    pass
@@ -0,0 +1,38 @@
+"""spray_card_stains cache table
+
+Revision ID: c4e81f0a2d95
+Revises: 270e53247037
+Create Date: 2026-10-18 10:12:04.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e81f0a2d95'
+down_revision = '270e53247037'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "spray_card_stains",
+        sa.Column("spray_card_id", sa.String, sa.ForeignKey("spray_cards.id"), primary_key=True),
+        sa.Column("image_hash", sa.String),
+        sa.Column("cache_key", sa.String),
+        sa.Column("threshold_grayscale_calculated", sa.Integer),
+        sa.Column("flag_max_stain_limit_reached", sa.Integer),
+        sa.Column("area_px2", sa.Float),
+        sa.Column("dv01", sa.Integer),
+        sa.Column("dv05", sa.Integer),
+        sa.Column("dv09", sa.Integer),
+        sa.Column("gpa", sa.Float),
+        sa.Column("lpha", sa.Float),
+        sa.Column("stains", sa.LargeBinary),
+    )
+
+
+def downgrade():
+    op.drop_table("spray_card_stains")
@@ -0,0 +1,25 @@
+"""image_codec to spray_cards
+
+Revision ID: e2b7c5d8a413
+Revises: 5a9d3e7b1f60
+Create Date: 2026-10-18 16:05:41.220917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e2b7c5d8a413"
+down_revision = "5a9d3e7b1f60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing images are left NULL, stored as the image files they were loaded from
+    op.add_column("spray_cards", sa.Column("image_codec", sa.String))
+
+
+def downgrade():
+    pass
@@ -143,6 +143,7 @@ CREATE TABLE IF NOT EXISTS spray_cards (
     threshold_color_brightness_max  INTEGER,
     threshold_color_brightness_pass INTEGER,
     watershed                       INTEGER,
+    segmentation_engine             TEXT,
     min_stain_area_px               INTEGER,
     stain_approximation_method      TEXT,
     dpi                             INTEGER,
@@ -151,5 +152,30 @@ CREATE TABLE IF NOT EXISTS spray_cards (
     spread_factor_b                 REAL,
     spread_factor_c                 REAL,
     has_image                       INTEGER,
-    image                           BLOB
-);
\ No newline at end of file
+    image                           BLOB,
+    image_codec                     TEXT
+);
+CREATE TABLE IF NOT EXISTS spray_card_stains (
+    spray_card_id                   TEXT PRIMARY KEY REFERENCES spray_cards(id),
+    image_hash                      TEXT,
+    cache_key                       TEXT,
+    threshold_grayscale_calculated  INTEGER,
+    flag_max_stain_limit_reached    INTEGER,
+    area_px2                        REAL,
+    dv01                            INTEGER,
+    dv05                            INTEGER,
+    dv09                            INTEGER,
+    gpa                             REAL,
+    lpha                            REAL,
+    stains                          BLOB,
+    confidence_intervals            TEXT
+);
+CREATE TABLE IF NOT EXISTS spray_card_thumbnails (
+    spray_card_id                   TEXT REFERENCES spray_cards(id),
+    level                           INTEGER,
+    width                           INTEGER,
+    height                          INTEGER,
+    image                           BLOB,
+    image_codec                     TEXT,
+    PRIMARY KEY (spray_card_id, level)
+);
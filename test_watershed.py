@@ -35,7 +35,7 @@ plt.imshow(scip2.get_mask_image())
 post = time.perf_counter()
 print(f"new in {post-pre:.4f} sec")
 print(f"Total Stain Count = {len(sc2.stains)}")
-print(f"Valid Stain Count = {len([s for s in sc2.stains if s['is_include']])}")
+print(f"Valid Stain Count = {sc2.stains.is_include.sum()}")
 #waits for user to press any key 
 #(this is necessary to avoid Python kernel form crashing)
 #cv2.waitKey(0) 